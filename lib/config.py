@@ -30,6 +30,15 @@ class Config:
     theme_use_cute_name: bool = True
     auto_change_to_frame: bool = True
     scaled_directly: bool = True
+    render_cache_size: int = 64  # MB
+    render_workers: int = 0  # 0 -> CPU核心数
+    numpy_compositor: bool = False
+    lazy_load_themes: bool = True
+    multi_size_cursors: bool = True
+    export_cache_size: int = 256  # MB, 0 -> 不缓存
+    render_profiling: bool = False
+    canvas_cache_size: int = 256  # MB
+    prerender_frames: int = 30
 
     def __init__(self):
         self.load_config()
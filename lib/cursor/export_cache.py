@@ -0,0 +1,145 @@
+import json
+import os
+from hashlib import blake2b
+from os.path import join, isfile
+from shutil import copyfile
+from typing import Callable, Iterator
+
+from PIL import Image
+
+from lib.config import config
+from lib.cursor.writer import write_cursor_progress
+from lib.data import CursorProject, AssetType
+from lib.datas.data_dir import main_dir
+from lib.datas.image_blob import ImageBlobWriter
+from lib.datas.source import source_manager
+from lib.datas.source_index import SourceIndex
+from lib.log import logger
+from lib.render import render_project
+from lib.render_pool import ProcessRenderer
+
+EXPORT_CACHE_VERSION = 2  # 指针文件的写入方式变化时递增, 使旧的缓存失效
+
+
+def collect_source_ids(project: CursorProject, source_ids: set[str]):
+    for element in project.elements:
+        for source_info in element.source_infos:
+            if source_info.type == AssetType.ZIP_FILE:
+                source_ids.add(source_info.source_id)
+        if element.sub_project:
+            collect_source_ids(element.sub_project, source_ids)
+
+
+class CursorExportCache:
+    """
+    导出的指针文件 (.cur/.ani) 的磁盘缓存, 程序重启后依然有效
+    键为项目数据、影响导出结果的配置与所用素材库压缩包版本的哈希, 主题未改变的项目重新应用时无需再渲染
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def make_key(project: CursorProject) -> str | None:
+        """计算项目导出结果的键, 素材库不可用时返回None (不缓存)"""
+        source_ids: set[str] = set()
+        collect_source_ids(project, source_ids)
+        try:
+            sources = {source_id: SourceIndex.archive_stat(source_manager.get_source_by_id(source_id).textures_zip)
+                       for source_id in sorted(source_ids)}
+        except Exception as e:
+            logger.debug(f"无法计算项目导出缓存的键: {project} -> {e.__class__.__name__}: {e}")
+            return None
+        data = {
+            "version": EXPORT_CACHE_VERSION,
+            "project": project.to_dict(ImageBlobWriter()),  # 图像以内容哈希表示
+            "sources": sources,
+            "scaled_directly": config.scaled_directly,
+            "multi_size_cursors": config.multi_size_cursors,
+        }
+        data_string = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        return blake2b(data_string.encode("utf-8"), digest_size=20).hexdigest()
+
+    def cache_path(self, key: str, project: CursorProject) -> str:
+        return join(self.cache_dir, key + (".ani" if project.is_ani_cursor else ".cur"))
+
+    def restore(self, key: str | None, project: CursorProject, file_path: str) -> bool:
+        """缓存命中时将缓存的指针文件复制到 file_path"""
+        if key is None or not config.export_cache_size:
+            return False
+        cache_path = self.cache_path(key, project)
+        if not isfile(cache_path):
+            return False
+        copyfile(cache_path, file_path)
+        os.utime(cache_path)  # 按修改时间淘汰, 命中时刷新
+        logger.debug(f"使用导出缓存: {project}")
+        return True
+
+    def contains(self, key: str | None, project: CursorProject) -> bool:
+        return key is not None and bool(config.export_cache_size) and isfile(self.cache_path(key, project))
+
+    def store(self, key: str | None, project: CursorProject, file_path: str):
+        """保存刚导出的指针文件, 超出大小上限时淘汰最久未使用的缓存"""
+        if key is None or not config.export_cache_size:
+            return
+        cache_path = self.cache_path(key, project)
+        temp_path = cache_path + ".tmp"
+        try:
+            copyfile(file_path, temp_path)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"无法保存导出缓存: {cache_path} -> {e}")
+            return
+        self.trim()
+
+    def trim(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        max_bytes = config.export_cache_size * 1024 * 1024
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+export_cache = CursorExportCache(main_dir.make_sub_dir("Export Cache"))
+
+
+def write_cursor_file(path: str, frames: list[Image.Image], project: CursorProject):
+    list(write_cursor_progress(path, frames, project))
+
+
+def export_cursors(projects: list[CursorProject], paths: list[str],
+                   write: Callable[[str, list[Image.Image], CursorProject], None] = write_cursor_file) \
+        -> Iterator[tuple[CursorProject, str]]:
+    """
+    将各项目导出至对应路径, 每写入或从导出缓存恢复一个项目后产出 (项目, 路径)
+    没有缓存的项目提前全部提交给多进程渲染器, 写入文件时后续项目仍在渲染
+    write(路径, 帧, 项目) 负责写入指针文件, 调用方可在其中显示写入进度
+    """
+    keys = [export_cache.make_key(project) for project in projects]
+    render_indexes: dict[int, int] = {}  # 项目序号 -> 渲染器中的序号, 只渲染没有导出缓存的项目
+    for i, project in enumerate(projects):
+        if not export_cache.contains(keys[i], project):
+            render_indexes[i] = len(render_indexes)
+    with ProcessRenderer([projects[i] for i in render_indexes]) as renderer:
+        for render_index in render_indexes.values():
+            renderer.submit(render_index, for_export=True)
+        for i, (project, path) in enumerate(zip(projects, paths)):
+            render_index = render_indexes.get(i)
+            if render_index is not None or not export_cache.restore(keys[i], project, path):
+                if render_index is not None:
+                    frames = renderer.render(render_index, for_export=True)
+                else:  # 缓存在导出过程中被淘汰
+                    frames = render_project(project, for_export=True)
+                write(path, frames, project)
+                export_cache.store(keys[i], project, path)
+            yield project, path
@@ -1,62 +1,158 @@
-from os import makedirs
-from os.path import expandvars, join
-from random import randbytes
-from shutil import copy as copy_file, rmtree
+import math
+import struct
+from hashlib import blake2b
+from typing import BinaryIO, Iterable
 
 from PIL import Image
-from PIL.Image import Resampling
+from PIL.Image import Dither, Resampling
 
+from lib.config import config
 from lib.data import CursorProject
 
-Image.ANTIALIAS = Resampling.LANCZOS
-from ani_file import ani_file
-from win_cur import Cursor
+# 参考: https://www.daubnet.com/en/file-format-cur  https://www.daubnet.com/en/file-format-ani
+ANI_HEADER_SIZE = 36
+AF_ICON = 1  # 帧为 icon/cur 数据
+AF_SEQUENCE = 2  # 存在 seq 块
+CURSOR_SIZE_FACTORS = (1, 1.5, 2, 3, 4)  # 多尺寸指针相对于100%缩放时的倍数, 对应32px指针的 32/48/64/96/128
 
 
-def create_project_cache():
-    temp_dir = expandvars("%TEMP%\\MineCursorCache")
-    makedirs(temp_dir, exist_ok=True)
-    project_dir = join(temp_dir, hex(int.from_bytes(randbytes(4), "big"))[2:])
-    makedirs(project_dir, exist_ok=True)
-    return project_dir
+def encode_cur_bitmap(frame: Image.Image) -> bytes:
+    """编码一张指针图像为32位BMP (BITMAPINFOHEADER + 自下而上的BGRA颜色 + AND掩码)"""
+    frame = frame.convert("RGBA")
+    width, height = frame.size
+    xor_data = frame.tobytes("raw", "BGRA", 0, -1)
+    # AND掩码: 1位单色图, 完全透明的像素为1, 每行对齐至4字节
+    mask = frame.getchannel("A").point(lambda a: 255 if a == 0 else 0).convert("1", dither=Dither.NONE)
+    row_size = (width + 7) // 8
+    row_stride = (row_size + 3) // 4 * 4
+    mask_data = mask.tobytes("raw", "1", 0, -1)
+    and_data = bytes().join(mask_data[i * row_size:(i + 1) * row_size].ljust(row_stride, b"\x00")
+                            for i in range(height))
+    header = struct.pack("<IiiHHIIiiII", 40, width, height * 2, 1, 32, 0, len(xor_data) + len(and_data), 0, 0, 0, 0)
+    return header + xor_data + and_data
 
 
-def write_ani(path: str, frames: list[Image.Image], project: CursorProject):
-    project_dir = create_project_cache()
-    hotspot = (int(project.center_pos[0] * project.scale * project.render_scale),
-               int(project.center_pos[1] * project.scale * project.render_scale))
+def encode_cur(images: list[tuple[Image.Image, tuple[int, int]]]) -> bytes:
+    """编码一个.cur文件, images 为 (图像, 热点) 列表, 系统按指针大小选用最接近的图像"""
+    bitmaps = [encode_cur_bitmap(image) for image, _ in images]
+    directory = struct.pack("<HHH", 0, 2, len(images))
+    entries = []
+    offset = 6 + 16 * len(images)
+    for (image, hotspot), bitmap in zip(images, bitmaps):
+        width, height = image.size
+        entries.append(struct.pack("<BBBBHHII", width % 256, height % 256, 0, 0,
+                                   hotspot[0], hotspot[1], len(bitmap), offset))
+        offset += len(bitmap)
+    return directory + bytes().join(entries) + bytes().join(bitmaps)
+
+
+def export_render_scale(project: CursorProject) -> int:
+    """导出时的渲染缩放, 导出多尺寸指针时至少渲染至最大的尺寸, 其余尺寸 (包括项目的渲染缩放) 由其缩小"""
+    if config.multi_size_cursors:
+        return max(project.render_scale, math.ceil(max(CURSOR_SIZE_FACTORS)))
+    return project.render_scale
+
+
+def get_export_hotspot(project: CursorProject) -> tuple[int, int]:
+    render_scale = export_render_scale(project)
+    return (int(project.center_pos[0] * project.scale * render_scale),
+            int(project.center_pos[1] * project.scale * render_scale))
+
+
+def resize_export_frame(frame: Image.Image, project: CursorProject) -> Image.Image:
+    """将导出的帧缩小至项目渲染缩放对应的尺寸, 用于导出图片等只需要单一尺寸的场合"""
+    ratio = project.render_scale / export_render_scale(project)
+    if ratio == 1:
+        return frame
+    return frame.resize((max(1, round(frame.width * ratio)), max(1, round(frame.height * ratio))), Resampling.BOX)
+
+
+def get_cursor_images(frame: Image.Image, project: CursorProject) -> list[tuple[Image.Image, tuple[int, int]]]:
+    """
+    由导出的帧 (export_render_scale 对应的最大尺寸) 缩小出其他尺寸, 返回 (图像, 热点) 列表
+    所有尺寸共用同一次渲染, 系统切换指针大小时直接选用对应尺寸
+    """
+    hotspot = get_export_hotspot(project)
+    images = [(frame, hotspot)]
+    if not config.multi_size_cursors:
+        return images
+    base_width = project.raw_canvas_size[0] * project.scale  # 渲染缩放为1时的指针宽度
+    widths = {round(base_width * factor) for factor in (*CURSOR_SIZE_FACTORS, project.render_scale)}
+    for width in sorted(widths, reverse=True):
+        if not 0 < width < frame.width:
+            continue
+        ratio = width / frame.width
+        image = frame.resize((width, max(1, round(frame.height * ratio))), Resampling.BOX)
+        images.append((image, (int(hotspot[0] * ratio), int(hotspot[1] * ratio))))
+    return images
+
+
+def write_chunk(f: BinaryIO, chunk_id: bytes, data: bytes):
+    f.write(chunk_id)
+    f.write(struct.pack("<I", len(data)))
+    f.write(data)
+    if len(data) % 2:  # RIFF块按2字节对齐
+        f.write(b"\x00")
+
+
+def frame_digest(frame: Image.Image) -> bytes:
+    digest = blake2b(f"{frame.mode}{frame.size}".encode(), digest_size=16)
+    digest.update(frame.tobytes())
+    return digest.digest()
+
+
+def write_ani(path: str, frames: Iterable[Image.Image], project: CursorProject):
+    """
+    将帧逐个编码并写入RIFF/ACON动画指针文件, frames 可以是渲染生成器
+    内容相同的帧只保存一次, 由 seq 块引用; 连续相同的帧合并为一步, 显示时间相加
+    块长度与帧数等信息在写入所有帧后回填, 不产生临时文件
+    """
     rates = project.real_ani_rates
 
-    files = []
-    for i, frame in enumerate(frames):
-        file_path = join(project_dir, f"{i}.png")
-        frame.save(file_path)
-        files.append(file_path)
-        yield "写入帧", i
-    ani_path = join(project_dir, "ani_file.ani")
-    ani = ani_file.open(ani_path, "w")
-    yield "合并帧", -1
-    ani.setframespath(files, xy=hotspot)
-    ani.setrate(rates)
-    ani.close()
-    yield "复制文件至保存路径", -1
-    copy_file(ani_path, path)
-    yield "删除临时文件", -1
-    rmtree(project_dir)
-
-
-def write_cur(frame: Image.Image, hotspot: tuple[int, int], path: str):
-    cur = Cursor()
-    cur.add_cursor(frame.width, frame.height, hotspot[0], hotspot[1], frame.tobytes())
-    cur.save_file(path)
-
-
-def write_cursor_progress(path: str, frames: list[Image.Image], project: CursorProject):
+    with open(path, "wb") as f:
+        f.write(b"RIFF\x00\x00\x00\x00ACON")
+        anih_pos = f.tell()
+        write_chunk(f, b"anih", bytes(ANI_HEADER_SIZE))
+        list_pos = f.tell()
+        f.write(b"LIST\x00\x00\x00\x00fram")
+        frame_slots: dict[bytes, int] = {}  # 帧内容哈希 -> 文件中的帧序号
+        sequence: list[int] = []  # 每一步显示的帧序号
+        step_rates: list[int] = []
+        for i, (frame, rate) in enumerate(zip(frames, rates)):
+            digest = frame_digest(frame)
+            slot = frame_slots.get(digest)
+            if slot is None:
+                slot = frame_slots[digest] = len(frame_slots)
+                write_chunk(f, b"icon", encode_cur(get_cursor_images(frame, project)))
+            if sequence and sequence[-1] == slot:
+                step_rates[-1] += rate
+            else:
+                sequence.append(slot)
+                step_rates.append(rate)
+            yield "写入帧", i
+        list_end = f.tell()
+
+        write_chunk(f, b"rate", struct.pack(f"<{len(step_rates)}I", *step_rates))
+        flags = AF_ICON
+        if sequence != list(range(len(frame_slots))):  # 帧按顺序各显示一次时不需要 seq 块
+            write_chunk(f, b"seq ", struct.pack(f"<{len(sequence)}I", *sequence))
+            flags |= AF_SEQUENCE
+        end_pos = f.tell()
+
+        f.seek(anih_pos + 8)
+        f.write(struct.pack("<9I", ANI_HEADER_SIZE, len(frame_slots), len(sequence),
+                            0, 0, 0, 0, step_rates[0] if step_rates else 0, flags))
+        f.seek(list_pos + 4)
+        f.write(struct.pack("<I", list_end - list_pos - 8))
+        f.seek(4)
+        f.write(struct.pack("<I", end_pos - 8))
+
+
+def write_cursor_progress(path: str, frames: Iterable[Image.Image], project: CursorProject):
     if path.endswith(".cur"):
         yield "保存至cur文件", -1
-        hotspot = (int(project.center_pos[0] * project.scale * project.render_scale),
-                   int(project.center_pos[1] * project.scale * project.render_scale))
-        write_cur(frames[0], hotspot, path)
+        with open(path, "wb") as f:
+            f.write(encode_cur(get_cursor_images(next(iter(frames)), project)))
     else:
         gen = write_ani(path, frames, project)
         while True:
@@ -0,0 +1,140 @@
+# 主题文件中以内容哈希去重的图像块
+# 图像以原始像素数据 (zlib压缩) 保存, 调色板等无法由像素数据还原的模式退回PNG编码
+# 已编码的图像按对象缓存, 图像对象在程序中视为只读, 再次保存时不会重新编码
+import weakref
+import zlib
+from hashlib import blake2b
+from io import BytesIO
+from threading import Lock
+from typing import Any
+
+from PIL import Image
+
+RAW_MODES = {"1", "L", "LA", "RGB", "RGBA", "I", "F"}
+
+
+class ImageBlob:
+    """一个已编码的图像块"""
+
+    def __init__(self, digest: str, format_: str, mode: str, size: tuple[int, int], data: bytes):
+        self.digest = digest
+        self.format = format_
+        self.mode = mode
+        self.size = size
+        self.data = data
+
+    @staticmethod
+    def encode(image: Image.Image) -> 'ImageBlob':
+        if image.mode in RAW_MODES:
+            raw = image.tobytes()
+            digest = blake2b(f"{image.mode}{image.size}".encode(), digest_size=16)
+            digest.update(raw)
+            return ImageBlob(digest.hexdigest(), "raw", image.mode, image.size, zlib.compress(raw, 1))
+        image_io = BytesIO()
+        image.save(image_io, format="PNG")
+        data = image_io.getvalue()
+        return ImageBlob(blake2b(data, digest_size=16).hexdigest(), "png", image.mode, image.size, data)
+
+    def decode(self, data: bytes) -> Image.Image:
+        if self.format == "raw":
+            return Image.frombytes(self.mode, self.size, zlib.decompress(data))
+        image = Image.open(BytesIO(data))
+        image.load()
+        return image
+
+    def record(self, offset: int) -> list[Any]:
+        return [offset, len(self.data), self.format, self.mode, list(self.size)]
+
+
+class ImageBlobCache:
+    """按图像对象缓存已编码的图像块, 图像对象被回收后自动移除"""
+
+    def __init__(self):
+        self.blobs: dict[int, tuple[weakref.ref, ImageBlob]] = {}
+        self.lock = Lock()
+
+    def encode(self, image: Image.Image) -> ImageBlob:
+        key = id(image)
+        with self.lock:
+            entry = self.blobs.get(key)
+            if entry is not None and entry[0]() is image:
+                return entry[1]
+        blob = ImageBlob.encode(image)
+        self.put(image, blob)
+        return blob
+
+    def put(self, image: Image.Image, blob: ImageBlob):
+        key = id(image)
+        ref = weakref.ref(image, lambda _: self.discard(key))
+        with self.lock:
+            self.blobs[key] = (ref, blob)
+
+    def discard(self, key: int):
+        with self.lock:
+            self.blobs.pop(key, None)
+
+
+class PendingBlob:
+    """延迟编码的图像, 在序列化时才编码为图像块"""
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+
+
+class ImageBlobWriter:
+    """
+    收集一个主题文件中的所有图像块, 相同内容的图像只保存一次
+    deferred 为True时 add 只记录图像, 由 json.dumps(default=resolve) 在序列化时编码, 可将编码移出调用线程
+    """
+
+    def __init__(self, deferred: bool = False):
+        self.blobs: dict[str, ImageBlob] = {}
+        self.deferred = deferred
+
+    def add(self, image: Image.Image) -> 'str | PendingBlob':
+        if self.deferred:
+            return PendingBlob(image)
+        blob = blob_cache.encode(image)
+        self.blobs.setdefault(blob.digest, blob)
+        return blob.digest
+
+    def resolve(self, obj: Any) -> str:
+        if not isinstance(obj, PendingBlob):
+            raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+        blob = blob_cache.encode(obj.image)
+        self.blobs.setdefault(blob.digest, blob)
+        return blob.digest
+
+    def table(self) -> dict[str, list[Any]]:
+        """图像块索引: 哈希 -> [偏移, 长度, 格式, 模式, 尺寸]"""
+        table = {}
+        offset = 0
+        for digest, blob in self.blobs.items():
+            table[digest] = blob.record(offset)
+            offset += len(blob.data)
+        return table
+
+    def chunks(self):
+        for blob in self.blobs.values():
+            yield blob.data
+
+
+class ImageBlobReader:
+    """从图像块区域读取图像, 同一图像块只解码一次, 由所有引用共享"""
+
+    def __init__(self, table: dict[str, list[Any]], region: bytes):
+        self.table = table
+        self.region = memoryview(region)
+        self.images: dict[str, Image.Image] = {}
+
+    def get(self, digest: str) -> Image.Image:
+        if digest not in self.images:
+            offset, length, format_, mode, size = self.table[digest]
+            blob = ImageBlob(digest, format_, mode, (size[0], size[1]), bytes(self.region[offset:offset + length]))
+            image = blob.decode(blob.data)
+            blob_cache.put(image, blob)  # 读取的图像再次保存时无需重新编码
+            self.images[digest] = image
+        return self.images[digest]
+
+
+blob_cache = ImageBlobCache()
@@ -1,24 +1,28 @@
 from base64 import b64encode, b64decode
 from datetime import datetime
 from io import BytesIO
+from itertools import count
 from typing import cast
 
 from PIL import Image
 
 from lib.cursor.setter import CursorKind
 from lib.datas.base_struct import *
+from lib.datas.image_blob import ImageBlobWriter, ImageBlobReader
 from lib.datas.source import AssetSourceInfo
 
+project_versions = count(1)  # 全局递增, 项目被修改时取新值, 子树中的最大值即为子树的版本
+
 
 class SubProjectFrames(list):
     def __init__(self, project: 'CursorProject'):
         super().__init__()
-        from lib.render import render_project_frame
-        self.render_project_frame = render_project_frame
+        from lib.render import render_sub_project_frame
+        self.render_sub_project_frame = render_sub_project_frame
         self.project = project
 
     def __getitem__(self, index: int):
-        return self.render_project_frame(self.project, index)
+        return self.render_sub_project_frame(self.project, index)
 
     def __len__(self):
         return self.project.frame_count
@@ -61,7 +65,9 @@ class CursorElement:
         self.loop_animation: bool = True
         self.reverse_animation: bool = False
         self.animation_data: list[AnimationFrameData] = [AnimationFrameData() for _ in range(len(frames))]
-        self.animation_data_index: list[int] = []
+        self.animation_data_index: list[int] = []  # 一个动画周期内每一帧对应的帧序号
+        self.animation_cycle_increment: int = 0  # 一个动画周期的帧序号增量
+        self.indexed_animation_data: list[AnimationFrameData] | None = None  # 构建索引时的动画数据
         self.proc_step = DEFAULT_PROC_ORDER
         self.allow_mask_scale = False
         self.final_rect = (0, 0, 16, 16)
@@ -86,33 +92,34 @@ class CursorElement:
             for _ in range(data.frame_delay):
                 self.animation_data_index.append(index)
             index += data.index_increment
+        self.animation_cycle_increment = index
+        self.indexed_animation_data = self.animation_data
 
     def get_frame_index(self, target_frame: int) -> int:
+        """查表获取目标帧的动画帧序号 (未取模), 动画数据被整体替换时自动重建索引"""
         target_frame -= self.animation_start_offset
-
-        timer_frame = 0
-        frame = 0
         if target_frame == 0:
             return 0
-        index = 0
-        clac_cnt = 0
-        while True:
-            data = self.animation_data[index]
-            timer_frame += data.frame_delay
-            index += 1
-            if index >= len(self.animation_data):
-                index = 0
-            if timer_frame > target_frame:
-                return frame
-            frame += data.index_increment
-            clac_cnt += 1
-            if clac_cnt > 1000:
-                raise RuntimeError("动画帧查找次数过多")
-
-    def to_dict(self):
+        if self.indexed_animation_data is not self.animation_data:
+            self.build_animation_index()
+        if not self.animation_data_index:
+            raise RuntimeError("动画数据中没有有效的帧延迟")
+        cycles, tick = divmod(target_frame, len(self.animation_data_index))
+        return cycles * self.animation_cycle_increment + self.animation_data_index[tick]
+
+    def get_frame_item_index(self, target_frame: int) -> int:
+        """获取元素在目标帧显示的帧在 frames 中的序号, 已处理开始偏移、循环与倒放"""
+        frame_count = len(self.frames)
+        frame_index = self.get_frame_index(target_frame) % frame_count
+        if self.reverse_animation:
+            frame_index = frame_count - frame_index - 1
+        return frame_index
+
+    def to_dict(self, blobs: ImageBlobWriter | None = None):
+        """blobs 不为None时, 图像以图像块哈希代替内联的PNG"""
         data = {
             "name": self.name,
-            "source_infos": [source_info.to_dict() for source_info in self.source_infos],
+            "source_infos": [source_info.to_dict(blobs) for source_info in self.source_infos],
             "position": self.position.save(),
             "scale": self.scale.save(),
             "rotation": self.rotation,
@@ -131,22 +138,24 @@ class CursorElement:
         }
         if self.allow_mask_scale:
             data["allow_mask_scale"] = self.allow_mask_scale
-        if self.mask:
+        if self.mask and blobs is not None:
+            data["mask_blob"] = blobs.add(self.mask)
+        elif self.mask:
             mask_io = BytesIO()
             self.mask.save(mask_io, format="PNG")
             data["mask"] = (self.mask.size, b64encode(mask_io.getbuffer()).decode("utf-8"))
         if self.mask_color:
             data["mask_color"] = list(self.mask_color)
         if self.sub_project:
-            data["sub_project"] = self.sub_project.to_dict()
+            data["sub_project"] = self.sub_project.to_dict(blobs)
         return data
 
     @staticmethod
-    def from_dict(data: dict) -> 'CursorElement':
+    def from_dict(data: dict, blobs: ImageBlobReader | None = None) -> 'CursorElement':
         element = CursorElement(
             name=data["name"],
             frames=[],
-            source_infos=[AssetSourceInfo.from_dict(source_info) for source_info in data["source_infos"]],
+            source_infos=[AssetSourceInfo.from_dict(source_info, blobs) for source_info in data["source_infos"]],
             position=Position.load(data["position"]),
             scale=Scale2D.load(data["scale"]),
             rotation=data["rotation"],
@@ -156,7 +165,9 @@ class CursorElement:
             resample=Image.Resampling(data["resample"]),
             scale_resample=Image.Resampling(data.get("scale_resample", Image.Resampling.NEAREST)),
         )
-        if "mask" in data:
+        if "mask_blob" in data:
+            element.mask = blobs.get(data["mask_blob"])
+        elif "mask" in data:
             if isinstance(data["mask"][1], bytes):
                 element.mask = Image.frombytes("L", data["mask"][0], data["mask"][1])
             else:
@@ -177,7 +188,7 @@ class CursorElement:
         element.reverse_way = ReverseWay(data.get("reverse_way", ReverseWay.BOTH.value))
         element.allow_mask_scale = data.get("allow_mask_scale", False)
         if data.get("sub_project"):
-            element.sub_project = CursorProject.from_dict(data["sub_project"])
+            element.sub_project = CursorProject.from_dict(data["sub_project"], blobs)
 
         for source_info in element.source_infos:
             frame = source_info.load_frame()
@@ -246,6 +257,8 @@ class CursorProject:
         self.make_time: float = 0.0
 
         self.id: str = generate_id(4)
+        self.version: int = 0
+        self.frame_cache: tuple[int, dict[int, Image.Image]] = (-1, {})  # (tree_version, 帧序号 -> 帧)
 
     @property
     def real_ani_rates(self) -> list[int]:
@@ -272,6 +285,19 @@ class CursorProject:
     def add_element(self, element: CursorElement):
         self.elements.insert(0, element)
 
+    def mark_changed(self):
+        """项目被修改后调用, 使本项目及引用它的父项目缓存的帧失效 (父项目通过 tree_version 得知子项目的修改)"""
+        self.version = next(project_versions)
+
+    @property
+    def tree_version(self) -> int:
+        """本项目与嵌套子项目中最新的版本, 任意一层子项目被修改后都会变化"""
+        version = self.version
+        for element in self.elements:
+            if element.sub_project:
+                version = max(version, element.sub_project.tree_version)
+        return version
+
     @property
     def friendly_name(self) -> str:
         return self.name if self.name else (self.external_name if self.external_name else self.kind.kind_name)
@@ -279,13 +305,13 @@ class CursorProject:
     def __str__(self):
         return f"<Project:[{self.name}{',' + self.external_name if self.external_name else ''}]>"
 
-    def to_dict(self):
+    def to_dict(self, blobs: ImageBlobWriter | None = None):
         data = {
             "name": self.name,
             "raw_canvas_size": list(self.raw_canvas_size),
             "external_name": self.external_name,
             "kind": self.kind.value,
-            "elements": [element.to_dict() for element in self.elements],
+            "elements": [element.to_dict(blobs) for element in self.elements],
             "center_pos": self.center_pos.save(),
             "scale": self.scale,
             "resample": self.resample.value,
@@ -305,14 +331,14 @@ class CursorProject:
         return data
 
     @staticmethod
-    def from_dict(data: dict) -> 'CursorProject':
+    def from_dict(data: dict, blobs: ImageBlobReader | None = None) -> 'CursorProject':
         project = CursorProject(
             name=data["name"],
             canvas_size=cast(tuple[int, int], tuple(data["raw_canvas_size"])),
         )
         project.external_name = data["external_name"]
         project.kind = CursorKind(data["kind"])
-        project.elements = [CursorElement.from_dict(element) for element in data["elements"]]
+        project.elements = [CursorElement.from_dict(element, blobs) for element in data["elements"]]
         project.center_pos = Position.load(data["center_pos"])
         project.scale = data["scale"]
         project.resample = Image.Resampling(data["resample"])
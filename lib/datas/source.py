@@ -1,15 +1,21 @@
 import json
+import mmap
 from base64 import b64decode, b64encode
-from io import BytesIO
+from io import BytesIO, RawIOBase
 from os import walk, makedirs
 from os.path import join, isfile, abspath, expandvars, dirname
+from threading import Lock, Thread, current_thread
 from typing import cast, Any
+from weakref import WeakValueDictionary
 from zipfile import ZipFile
 
 from PIL import Image
 
 from lib.config import config
 from lib.datas.base_struct import AssetType
+from lib.datas.image_blob import ImageBlobWriter, ImageBlobReader
+from lib.datas.source_index import SourceIndex, INDEX_FILE_NAME
+from lib.datas.source_thumbnail import ThumbnailAtlas, ATLAS_IMAGE_NAME, ATLAS_INDEX_NAME
 from lib.log import logger
 
 
@@ -55,6 +61,10 @@ class AssetSource:
     def textures_zip(self):
         return self.fmt("textures.zip")
 
+    @property
+    def index_file(self):
+        return self.fmt(INDEX_FILE_NAME)
+
     @property
     def recommend_file(self):
         t = self.fmt("recommend.json")
@@ -98,6 +108,44 @@ class AssetSource:
             f.write(context)
 
 
+class MappedFile(RawIOBase):
+    """
+    以只读内存映射打开的文件, 供ZipFile按需读取其中的文件
+    只有被读取过的页面会驻留内存, 且由系统在内存紧张时回收
+    """
+
+    def __init__(self, file_path: str):
+        super().__init__()
+        with open(file_path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # 映射会保留自己的文件句柄
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.map.seek(offset, whence)
+        return self.map.tell()
+
+    def tell(self) -> int:
+        return self.map.tell()
+
+    def read(self, size: int | None = -1) -> bytes:
+        return self.map.read(-1 if size is None else size)
+
+    def readinto(self, buffer) -> int:
+        data = self.map.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.map.close()
+        super().close()
+
+
 class AssetSourceManager:
     """素材库管理器"""
     MINECRAFT_25W32A = AssetSource.from_file("assets/sources/25w32a/source.json")
@@ -114,21 +162,83 @@ class AssetSourceManager:
         self.internal_sources = self.find_internal_sources()
         self.user_sources: list[AssetSource] = self.load_sources(self.user_sources_dir)
         self.zips: dict[str, ZipFile] = {}
+        self.mapped_files: dict[str, MappedFile] = {}
+        self.indexes: dict[str, SourceIndex] = {}
+        self.atlases: dict[str, ThumbnailAtlas] = {}
+        self.atlas_threads: dict[str, Thread] = {}
+        # 图集线程与解码线程会同时加载同一素材库, 避免重复打开压缩包或重复生成索引 (加锁顺序: 索引 -> 压缩包)
+        self.zip_lock = Lock()
+        self.index_lock = Lock()
 
         if config.enabled_sources is None:
             config.enabled_sources = [source.id for source in self.sources]
         else:
             config.enabled_sources = list(set(config.enabled_sources))
 
+    def release_source(self, source_id: str):
+        """释放素材库的压缩包与已解码的贴图, 在删除或替换素材库前调用"""
+        with self.index_lock, self.zip_lock:
+            zip_file = self.zips.pop(source_id, None)
+            if zip_file:
+                zip_file.close()
+            mapped_file = self.mapped_files.pop(source_id, None)
+            if mapped_file:
+                mapped_file.close()  # 关闭映射, 否则Windows下无法删除压缩包
+            self.indexes.pop(source_id, None)
+        self.atlases.pop(source_id, None)
+        self.atlas_threads.pop(source_id, None)
+        texture_table.clear(source_id)
+
     def load_zip(self, source_id: str):
-        """加载素材库的资源压缩包, 缓存避免重复打开"""
-        if source_id not in self.zips:
-            source = source_manager.get_source_by_id(source_id)
-            with open(source.fmt(source.textures_zip), "rb") as f:
-                bytes_io = BytesIO(f.read())
-            self.zips[source_id] = ZipFile(bytes_io)
+        """加载素材库的资源压缩包, 压缩包以内存映射打开, 中央目录只在首次加载时解析"""
+        with self.zip_lock:
+            if source_id not in self.zips:
+                source = source_manager.get_source_by_id(source_id)
+                zip_path = source.fmt(source.textures_zip)
+                try:
+                    mapped_file = MappedFile(zip_path)
+                except ValueError:  # 空文件无法映射
+                    self.zips[source_id] = ZipFile(zip_path)
+                else:
+                    self.mapped_files[source_id] = mapped_file
+                    self.zips[source_id] = ZipFile(mapped_file)
+
+            return self.zips[source_id]
+
+    def load_index(self, source_id: str) -> SourceIndex:
+        """加载素材库压缩包内容的索引"""
+        with self.index_lock:
+            if source_id not in self.indexes:
+                source = self.get_source_by_id(source_id)
+                self.indexes[source_id] = SourceIndex.load(self.load_zip(source_id), source.textures_zip,
+                                                           source.index_file)
+            return self.indexes[source_id]
+
+    def get_atlas(self, source_id: str) -> ThumbnailAtlas | None:
+        """获取素材库的缩略图图集, 图集需要重新生成时在后台线程生成, 并在生成完毕前返回None"""
+        if source_id in self.atlases:
+            return self.atlases[source_id]
+        if source_id in self.atlas_threads:
+            return None
+        source = self.get_source_by_id(source_id)
+        atlas = ThumbnailAtlas.load(source.textures_zip, source.fmt(ATLAS_IMAGE_NAME), source.fmt(ATLAS_INDEX_NAME))
+        if atlas is not None:
+            self.atlases[source_id] = atlas
+            return atlas
+        thread = Thread(target=self.build_atlas, args=(source_id,), daemon=True)
+        self.atlas_threads[source_id] = thread
+        thread.start()
+        return None
 
-        return self.zips[source_id]
+    def build_atlas(self, source_id: str):
+        source = self.get_source_by_id(source_id)
+        index = self.load_index(source_id)
+        atlas = ThumbnailAtlas.load_or_build(self.load_zip(source_id), source.textures_zip,
+                                             list(index.image_sizes.keys()),
+                                             source.fmt(ATLAS_IMAGE_NAME), source.fmt(ATLAS_INDEX_NAME))
+        if self.atlas_threads.get(source_id) is current_thread():  # 生成期间素材库未被释放
+            self.atlases[source_id] = atlas
+            self.atlas_threads.pop(source_id)
 
     @staticmethod
     def load_sources(root: str):
@@ -177,6 +287,47 @@ class AssetSourceManager:
         return sources
 
 
+class TextureTable:
+    """
+    已解码贴图的进程级去重表, 以 (素材库ID, 贴图路径) 为键
+    表中只保存弱引用: 贴图仍被元素使用时, 所有主题的元素共享同一份, 不再被使用后随之释放, 因此不设内存上限
+    共享的帧请勿原地修改, 需要修改时先 copy()
+    """
+
+    def __init__(self):
+        self.frames: WeakValueDictionary[tuple[str, str], Image.Image] = WeakValueDictionary()
+        self.lock = Lock()
+
+    @staticmethod
+    def decode(source_id: str, source_path: str) -> Image.Image:
+        zip_file = source_manager.load_zip(source_id)
+        try:
+            raw_image = Image.open(zip_file.open(source_path))
+        except KeyError:
+            raise SourceFileMissingError(source_id, source_path)
+        result = raw_image.convert("RGBA")
+        if raw_image.mode == "L":
+            result.raw_image = raw_image
+        return result
+
+    def get(self, source_id: str, source_path: str) -> Image.Image:
+        key = (source_id, source_path)
+        with self.lock:
+            frame = self.frames.get(key)
+        if frame is not None:
+            return frame
+
+        frame = self.decode(source_id, source_path)
+        with self.lock:
+            return self.frames.setdefault(key, frame)  # 其他线程已解码时使用先存入的帧
+
+    def clear(self, source_id: str | None = None):
+        with self.lock:
+            for key in list(self.frames.keys()):
+                if source_id is None or key[0] == source_id:
+                    self.frames.pop(key, None)
+
+
 class AssetSourceInfo:
     """特定类型的素材信息, 包含类型，来源，路径等"""
 
@@ -198,7 +349,7 @@ class AssetSourceInfo:
 
         self.image = image
 
-    def to_dict(self) -> dict[str, Any]:
+    def to_dict(self, blobs: ImageBlobWriter | None = None) -> dict[str, Any]:
         data: dict[str, Any] = {"type": self.type.value}
         if self.type == AssetType.ZIP_FILE:
             data["source_id"] = self.source_id
@@ -207,14 +358,17 @@ class AssetSourceInfo:
             data["size"] = list(self.size)
             data["color"] = list(self.color)
         elif self.type == AssetType.IMAGE:
+            data["size"] = list(self.size)
+            if blobs is not None:
+                data["image_blob"] = blobs.add(self.image)
+                return data
             image_io = BytesIO()
             self.image.save(image_io, format="PNG")
-            data["size"] = list(self.size)
             data["image"] = b64encode(image_io.getvalue()).decode("utf-8")
         return data
 
     @staticmethod
-    def from_dict(data: dict[str, Any]):
+    def from_dict(data: dict[str, Any], blobs: ImageBlobReader | None = None):
         asset_type = AssetType(data["type"])
         if asset_type == AssetType.ZIP_FILE:
             return AssetSourceInfo(
@@ -229,8 +383,10 @@ class AssetSourceInfo:
                 color=cast(tuple[int, int, int, int], tuple(data["color"]))
             )
         elif asset_type == AssetType.IMAGE:
-            image_io = BytesIO(b64decode(data["image"]))
-            image = Image.open(image_io)
+            if "image_blob" in data:
+                image = blobs.get(data["image_blob"])
+            else:
+                image = Image.open(BytesIO(b64decode(data["image"])))
             return AssetSourceInfo(
                 type_=asset_type,
                 size=image.size,
@@ -240,15 +396,7 @@ class AssetSourceInfo:
     def load_frame(self) -> Image.Image:
         """将本素材信息加载成位图帧"""
         if self.type == AssetType.ZIP_FILE:
-            zip_file = source_manager.load_zip(self.source_id)
-            try:
-                raw_image = Image.open(zip_file.open(self.source_path))
-                result = raw_image.convert("RGBA")
-                if raw_image.mode == "L":
-                    result.raw_image = raw_image
-                return result
-            except KeyError:
-                raise SourceFileMissingError(self.source_id, self.source_path)
+            return texture_table.get(self.source_id, self.source_path)
         elif self.type == AssetType.RECT:
             if len(self.color) == 3:
                 return Image.new("RGBA", self.size, (*self.color, 255))
@@ -259,4 +407,5 @@ class AssetSourceInfo:
         raise NotImplementedError("Unsupported asset type")
 
 
+texture_table = TextureTable()
 source_manager: AssetSourceManager = AssetSourceManager()
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from os import cpu_count
+from threading import Event
+from typing import Callable, Hashable, Iterable
+
+from PIL import Image, UnidentifiedImageError
+
+from lib.datas.source import source_manager, SourceFileMissingError
+from lib.log import logger
+
+DecodeResult = tuple[Hashable, Image.Image]
+DECODE_WORKERS = min(4, cpu_count() or 1)
+DECODE_BATCH_SIZE = 32
+
+
+def decode_rgba(image: Image.Image) -> Image.Image:
+    return image.convert("RGBA")
+
+
+class DecodeTask:
+    """一组提交给解码服务的贴图, 取消后未开始的批次不再解码, 已解码的批次也不再回调"""
+
+    def __init__(self):
+        self.cancelled = Event()
+        self.futures: list[Future] = []
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures:
+            future.cancel()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.cancelled.is_set()
+
+    @property
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+
+class SourceDecodeService:
+    """
+    素材库贴图的后台解码服务
+    在线程池中从压缩包读取并解码贴图, 按批次回调结果, 回调在工作线程中执行, 界面需自行转回主线程
+    """
+
+    def __init__(self, workers: int = DECODE_WORKERS):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="SourceDecoder")
+
+    @staticmethod
+    def decode_one(source_id: str, path: str,
+                   transform: Callable[[Image.Image], Image.Image] = decode_rgba) -> Image.Image:
+        zip_file = source_manager.load_zip(source_id)
+        try:
+            with Image.open(zip_file.open(path)) as image:
+                return transform(image)
+        except KeyError:
+            raise SourceFileMissingError(source_id, path)
+
+    def decode_batch(self, task: DecodeTask, source_id: str, batch: list[tuple[Hashable, str]],
+                     transform: Callable[[Image.Image], Image.Image],
+                     on_batch: Callable[[DecodeTask, list[DecodeResult]], None]):
+        results: list[DecodeResult] = []
+        for key, path in batch:
+            if task.is_cancelled:
+                return
+            try:
+                results.append((key, self.decode_one(source_id, path, transform)))
+            except SourceFileMissingError:
+                logger.debug(f"素材库中不存在: {path}")
+            except UnidentifiedImageError:
+                logger.info(f"图片读取错误: {path}")
+        if results and not task.is_cancelled:
+            on_batch(task, results)
+
+    def submit(self, source_id: str, items: Iterable[tuple[Hashable, str]],
+               on_batch: Callable[[DecodeTask, list[DecodeResult]], None],
+               transform: Callable[[Image.Image], Image.Image] = decode_rgba,
+               batch_size: int = DECODE_BATCH_SIZE) -> DecodeTask:
+        """提交 (键, 贴图路径) 列表, 每解码完一批就以 (任务, [(键, 图像)]) 调用 on_batch"""
+        task = DecodeTask()
+        items = list(items)
+        for i in range(0, len(items), batch_size):
+            task.futures.append(self.executor.submit(self.decode_batch, task, source_id, items[i:i + batch_size],
+                                                     transform, on_batch))
+        return task
+
+    def decode(self, source_id: str, paths: list[str],
+               transform: Callable[[Image.Image], Image.Image] = decode_rgba) -> list[Image.Image]:
+        """并行解码并按顺序返回所有贴图, 会阻塞至全部完成"""
+        return list(self.executor.map(lambda path: self.decode_one(source_id, path, transform), paths))
+
+
+decode_service = SourceDecodeService()
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any
+from zipfile import ZipFile
+
+from PIL import Image, UnidentifiedImageError
+
+from lib.log import logger
+from lib.perf import Counter
+
+INDEX_FILE_NAME = "source_index.json"
+INDEX_VERSION = 1
+
+NUM_PATTER = re.compile(r'_?\d+')
+ANIM_FRAME_PATTER = re.compile(r'\d+\.\w+$')
+
+
+@dataclass
+class SourceIndex:
+    """
+    素材库压缩包内容的索引, 保存在 source.json 旁
+    压缩包的修改时间或大小变化时失效, 打开素材浏览器时不再遍历压缩包与匹配文件名
+    """
+    archive_mtime: int
+    archive_size: int
+    root_names: list[str] = field(default_factory=list)  # 压缩包内的根目录
+    root_files: dict[str, list[str]] = field(default_factory=dict)  # 根节点名称 -> 文件路径
+    flat_assets: dict[str, list[str]] = field(default_factory=dict)  # 根节点名称 -> 平铺展开的素材路径 (动画以去除序号的路径表示)
+    animations: dict[str, list[str]] = field(default_factory=dict)  # 去除序号的路径 -> 排序后的动画帧路径
+    image_sizes: dict[str, tuple[int, int]] = field(default_factory=dict)  # 图片路径 -> 尺寸
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "archive_mtime": self.archive_mtime,
+            "archive_size": self.archive_size,
+            "root_names": self.root_names,
+            "root_files": self.root_files,
+            "flat_assets": self.flat_assets,
+            "animations": self.animations,
+            "image_sizes": {path: list(size) for path, size in self.image_sizes.items()},
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> 'SourceIndex':
+        return SourceIndex(
+            archive_mtime=data["archive_mtime"],
+            archive_size=data["archive_size"],
+            root_names=data["root_names"],
+            root_files=data["root_files"],
+            flat_assets=data["flat_assets"],
+            animations=data["animations"],
+            image_sizes={path: (size[0], size[1]) for path, size in data["image_sizes"].items()},
+        )
+
+    @staticmethod
+    def archive_stat(zip_path: str) -> tuple[int, int]:
+        stat = os.stat(zip_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def build(zip_file: ZipFile, zip_path: str) -> 'SourceIndex':
+        """遍历压缩包建立索引"""
+        index = SourceIndex(*SourceIndex.archive_stat(zip_path))
+        for info in zip_file.NameToInfo.values():
+            fp = info.filename.split("/")
+            if fp[-1].endswith(".mcmeta"):  # 筛选掉 .mcmeta文件
+                continue
+            root_name = fp[0]
+            if info.is_dir():
+                if len(fp) == 2:
+                    index.root_names.append(root_name)
+                continue
+            index.root_files.setdefault(root_name, []).append(info.filename)
+            try:
+                with Image.open(zip_file.open(info)) as image:  # 只读取文件头
+                    index.image_sizes[info.filename] = image.size
+            except UnidentifiedImageError:
+                pass
+        for root_name, files in index.root_files.items():
+            index.flat_assets[root_name] = index.flat_expand(files)
+        return index
+
+    def flat_expand(self, files: list[str]) -> list[str]:
+        """找出文件列表中的动画帧序列, 返回平铺展开后的素材列表"""
+        asset_list = []
+        animation_frames: dict[str, dict[int, str]] = {}
+        # 初步筛选出动画帧
+        for full_path in files:
+            filename = full_path.split("/")[-1]
+
+            if re.findall(ANIM_FRAME_PATTER, filename):  # 如果文件名以数字结尾
+                no_num_path = re.sub(NUM_PATTER, "", full_path)
+                number = int(re.findall(NUM_PATTER, filename)[0].lstrip("_"))
+                if no_num_path not in animation_frames:
+                    animation_frames[no_num_path] = {number: full_path}
+                else:
+                    animation_frames[no_num_path][number] = full_path
+            asset_list.append(full_path)
+
+        # 排除被误判的动画帧 + 排序帧
+        for no_num_path, frames in animation_frames.items():
+            if len(frames) == 1:  # 只有一帧, pass
+                continue
+            numbers = sorted(frames.keys())
+            if list(range(len(frames))) != numbers:  # 不是有序序列, pass
+                continue
+            # 删除+更新
+            first_index = asset_list.index(frames[0])
+            [asset_list.remove(path) for path in frames.values()]
+            asset_list.insert(first_index, no_num_path)
+            self.animations[no_num_path] = [frames[number] for number in numbers]
+        return asset_list
+
+    @staticmethod
+    def load(zip_file: ZipFile, zip_path: str, index_path: str) -> 'SourceIndex':
+        """读取索引文件, 索引不存在或已失效时重新建立并保存"""
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION and \
+                    (data["archive_mtime"], data["archive_size"]) == SourceIndex.archive_stat(zip_path):
+                return SourceIndex.from_dict(data)
+            logger.info(f"素材库索引已失效: {index_path}")
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            logger.warning(f"素材库索引损坏: {index_path} -> {e.__class__.__name__}: {e}")
+
+        timer = Counter()
+        index = SourceIndex.build(zip_file, zip_path)
+        logger.info(f"已建立素材库索引: {index_path}, 用时: {timer.endT()}")
+        try:
+            with open(index_path, "w", encoding="utf-8") as f:
+                json.dump(index.to_dict(), f, ensure_ascii=False)
+        except OSError as e:  # 内置素材库所在目录可能不可写, 此时只在内存中使用
+            logger.warning(f"无法保存素材库索引: {index_path} -> {e}")
+        return index
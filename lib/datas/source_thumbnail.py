@@ -0,0 +1,121 @@
+import json
+from zipfile import ZipFile
+
+from PIL import Image, UnidentifiedImageError
+from PIL.Image import Resampling
+
+from lib.datas.source_index import SourceIndex
+from lib.log import logger
+from lib.perf import Counter
+
+THUMBNAIL_SIZE = 16
+ATLAS_COLUMNS = 64
+ATLAS_VERSION = 1
+ATLAS_IMAGE_NAME = "thumbnails.png"
+ATLAS_INDEX_NAME = "thumbnails.json"
+
+
+def translate_item_icon(image: Image.Image) -> Image.Image:
+    image = image.convert("RGBA")
+    if image.size == (16, 16):
+        return image
+    elif image.size == (18, 18):  # 效果图标
+        return image.crop((1, 1, 17, 17))
+    t_width = min(image.width, 16)
+    t_height = min(image.height, 16)
+    image = image.resize((t_width, t_height), Resampling.BICUBIC)
+    if image.size == (16, 16):
+        return image
+    base = Image.new("RGBA", (16, 16))
+    base.paste(image, (int((16 - image.width) / 2), int((16 - image.height) / 2)))  # 居中粘贴
+    return base
+
+
+class ThumbnailAtlas:
+    """
+    素材库所有贴图的16x16缩略图图集, 每个缩略图按序号排列在一张RGBA图上
+    图集与序号表保存在 source.json 旁, 压缩包的修改时间或大小变化时失效
+    """
+
+    def __init__(self, sheet: Image.Image, paths: list[str], archive_stat: tuple[int, int]):
+        self.sheet = sheet
+        self.paths = paths
+        self.slots: dict[str, int] = {path: i for i, path in enumerate(paths)}
+        self.archive_stat = archive_stat
+
+    def rect(self, path: str) -> tuple[int, int, int, int] | None:
+        """获取缩略图在图集中的 (x, y, 宽, 高), 没有缩略图时返回None"""
+        slot = self.slots.get(path)
+        if slot is None:
+            return None
+        row, column = divmod(slot, ATLAS_COLUMNS)
+        return column * THUMBNAIL_SIZE, row * THUMBNAIL_SIZE, THUMBNAIL_SIZE, THUMBNAIL_SIZE
+
+    def get(self, path: str) -> Image.Image | None:
+        rect = self.rect(path)
+        if rect is None:
+            return None
+        x, y, width, height = rect
+        return self.sheet.crop((x, y, x + width, y + height))
+
+    @staticmethod
+    def build(zip_file: ZipFile, zip_path: str, image_paths: list[str]) -> 'ThumbnailAtlas':
+        """解码所有贴图并排列为图集, 耗时较长, 请在后台线程中调用"""
+        archive_stat = SourceIndex.archive_stat(zip_path)
+        thumbnails: list[tuple[str, Image.Image]] = []
+        for path in image_paths:
+            try:
+                with Image.open(zip_file.open(path)) as image:
+                    thumbnails.append((path, translate_item_icon(image)))
+            except (UnidentifiedImageError, KeyError):
+                logger.debug(f"无法生成缩略图: {path}")
+        rows = max(1, (len(thumbnails) + ATLAS_COLUMNS - 1) // ATLAS_COLUMNS)
+        sheet = Image.new("RGBA", (ATLAS_COLUMNS * THUMBNAIL_SIZE, rows * THUMBNAIL_SIZE))
+        for i, (_, thumbnail) in enumerate(thumbnails):
+            row, column = divmod(i, ATLAS_COLUMNS)
+            sheet.paste(thumbnail, (column * THUMBNAIL_SIZE, row * THUMBNAIL_SIZE))
+        return ThumbnailAtlas(sheet, [path for path, _ in thumbnails], archive_stat)
+
+    def save(self, image_path: str, index_path: str):
+        self.sheet.save(image_path, "PNG", compress_level=1)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": ATLAS_VERSION,
+                "archive_mtime": self.archive_stat[0],
+                "archive_size": self.archive_stat[1],
+                "paths": self.paths,
+            }, f, ensure_ascii=False)
+
+    @staticmethod
+    def load(zip_path: str, image_path: str, index_path: str) -> 'ThumbnailAtlas | None':
+        """读取保存的图集, 不存在或已失效时返回None"""
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            archive_stat = (data["archive_mtime"], data["archive_size"])
+            if data.get("version") != ATLAS_VERSION or archive_stat != SourceIndex.archive_stat(zip_path):
+                logger.info(f"缩略图图集已失效: {image_path}")
+                return None
+            with Image.open(image_path) as image:
+                sheet = image.convert("RGBA")
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, UnidentifiedImageError) as e:
+            logger.warning(f"缩略图图集损坏: {image_path} -> {e.__class__.__name__}: {e}")
+            return None
+        return ThumbnailAtlas(sheet, data["paths"], archive_stat)
+
+    @staticmethod
+    def load_or_build(zip_file: ZipFile, zip_path: str, image_paths: list[str],
+                      image_path: str, index_path: str) -> 'ThumbnailAtlas':
+        atlas = ThumbnailAtlas.load(zip_path, image_path, index_path)
+        if atlas is not None:
+            return atlas
+        timer = Counter()
+        atlas = ThumbnailAtlas.build(zip_file, zip_path, image_paths)
+        logger.info(f"已生成缩略图图集: {image_path}, {len(atlas.paths)}张, 用时: {timer.endT()}")
+        try:
+            atlas.save(image_path, index_path)
+        except OSError as e:  # 内置素材库所在目录可能不可写, 此时只在内存中使用
+            logger.warning(f"无法保存缩略图图集: {image_path} -> {e}")
+        return atlas
@@ -1,8 +1,11 @@
 from dataclasses import field, dataclass
 from datetime import datetime
+from threading import Lock
+from typing import Any, Callable
 
 from lib.config import config
 from lib.datas.base_struct import *
+from lib.datas.image_blob import ImageBlobWriter, ImageBlobReader
 from lib.datas.project import CursorProject
 from lib.t_struct import ThemeType
 
@@ -37,9 +40,10 @@ class CursorTheme:
         return self.id == other.id
 
     def __str__(self):
-        return f"<Theme:[{self.name}],{self.base_size}px,{len(self.projects)}-curs>"
+        return f"<Theme:[{self.name}],{self.base_size}px,{self.project_count}-curs>"
 
-    def to_dict(self):
+    def header_dict(self) -> dict[str, Any]:
+        """主题除项目以外的信息"""
         data = {
             "name": self.name,
             "type": self.type.value,
@@ -48,7 +52,6 @@ class CursorTheme:
             "version": self.version,
             "author": self.author,
             "description": self.description,
-            "projects": [project.to_dict() for project in self.projects],
             "create_time": self.create_time,
         }
         if self.note:
@@ -57,9 +60,15 @@ class CursorTheme:
             data["license_info"] = self.license_info
         return data
 
+    def to_dict(self, blobs: ImageBlobWriter | None = None):
+        data = self.header_dict()
+        data["projects"] = [project.to_dict(blobs) for project in self.projects]
+        return data
+
     @staticmethod
-    def from_dict(data: dict) -> 'CursorTheme':
-        return CursorTheme(
+    def parse_header(data: dict) -> dict[str, Any]:
+        """解析 header_dict() 的数据为构造参数"""
+        return dict(
             name=data["name"],
             type=ThemeType(data.get("type", ThemeType.NORMAL)),
             id=data["id"],
@@ -67,12 +76,16 @@ class CursorTheme:
             version=data.get("version", "1.0.0"),
             author=data["author"],
             description=data["description"],
-            projects=[CursorProject.from_dict(project) for project in data["projects"]],
             note=data.get("note", ""),
             license_info=data.get("license_info", ""),
             create_time=data.get("create_time", "Unknow")
         )
 
+    @staticmethod
+    def from_dict(data: dict, blobs: ImageBlobReader | None = None) -> 'CursorTheme':
+        return CursorTheme(**CursorTheme.parse_header(data),
+                           projects=[CursorProject.from_dict(project, blobs) for project in data["projects"]])
+
     def refresh_id(self):
         self.id = generate_id()
 
@@ -84,3 +97,48 @@ class CursorTheme:
     @property
     def make_time(self):
         return sum(project.make_time for project in self.projects)
+
+    @property
+    def project_count(self) -> int:
+        return len(self.projects)
+
+
+class LazyCursorTheme(CursorTheme):
+    """
+    仅加载了头信息的主题
+    首次访问 projects 时才通过 loader 加载完整的项目, 在此之前列表展示所需的信息均可直接使用
+    """
+
+    def __init__(self, header: dict[str, Any], loader: Callable[['LazyCursorTheme'], list[CursorProject]]):
+        super().__init__(**CursorTheme.parse_header(header))
+        del self.projects  # 使对 projects 的访问进入 __getattr__
+        self.loader = loader
+        self.loaded_header = self.header_dict()
+        self.header_project_count: int = header["project_count"]
+        self.hydrate_failed = False
+        self.hydrate_lock = Lock()
+
+    def __getattr__(self, name: str):
+        if name != "projects":
+            raise AttributeError(name)
+        self.hydrate()
+        return self.__dict__["projects"]
+
+    @property
+    def hydrated(self) -> bool:
+        return "projects" in self.__dict__
+
+    def hydrate(self):
+        """加载主题的完整项目, 可在任意线程调用"""
+        with self.hydrate_lock:
+            if not self.hydrated:
+                self.projects = self.loader(self)
+
+    @property
+    def header_changed(self) -> bool:
+        """主题信息是否在加载后被修改过"""
+        return self.header_dict() != self.loaded_header
+
+    @property
+    def project_count(self) -> int:
+        return len(self.projects) if self.hydrated else self.header_project_count
@@ -2,11 +2,35 @@ import wx
 from PIL import Image
 
 
+def rgba_image(image: Image.Image) -> Image.Image:
+    return image if image.mode == "RGBA" else image.convert("RGBA")
+
+
 def PilImg2WxImg(image: Image.Image) -> wx.Image:
-    """PIL的Image转化为wxImage"""
-    bitmap: wx.Image = wx.Image(image.size[0], image.size[1])
-    bitmap.SetData(image.convert("RGB").tobytes())
-    bitmap.alpha_buffer = image.convert("RGBA").getchannel("A").tobytes()
-    bitmap.SetAlphaBuffer(bitmap.alpha_buffer)
-    return bitmap
+    """PIL的Image转化为wxImage, 颜色与透明度从同一个RGBA图像直接打包"""
+    image = rgba_image(image)
+    return wx.Image(image.width, image.height, image.tobytes("raw", "RGB"), image.tobytes("raw", "A"))
+
+
+def PilImg2WxBmp(image: Image.Image) -> wx.Bitmap:
+    """PIL的Image转化为wxBitmap, 由一块RGBA缓冲区直接创建, 不经过wxImage"""
+    image = rgba_image(image)
+    return wx.Bitmap.FromBufferRGBA(image.width, image.height, image.tobytes())
+
 
+def PilImgs2ImageList(image_list: wx.ImageList, images: list[Image.Image]) -> list[int]:
+    """
+    批量添加图像至 image_list, 返回各图像的序号
+    图像均与列表的图像尺寸一致时横向拼接为一张位图, 只转换与添加一次 (ImageList会按宽度自动切分)
+    """
+    if not images:
+        return []
+    first = image_list.GetImageCount()
+    size = image_list.GetSize(0)
+    if any(image.size != tuple(size) for image in images):
+        return [image_list.Add(PilImg2WxBmp(image)) for image in images]
+    strip = Image.new("RGBA", (size[0] * len(images), size[1]))
+    for i, image in enumerate(images):
+        strip.paste(rgba_image(image), (i * size[0], 0))
+    image_list.Add(PilImg2WxBmp(strip))
+    return list(range(first, first + len(images)))
@@ -4,14 +4,17 @@ from PIL import Image
 from PIL.Image import Transpose, Resampling
 
 from lib.config import config
-from lib.data import CursorProject, ProcessStep, Margins, Scale2D, ReverseWay
+from lib.cursor.writer import export_render_scale
+from lib.data import CursorProject, CursorElement, ProcessStep, Margins, Scale2D, ReverseWay
 from lib.log import logger
 from lib.perf import Counter
+from lib.render_cache import ElementLayer, TransformParams, transform_cache
+from lib.render_np import use_numpy_compositor, ArrayCanvas, tint_image, masked_array
+from lib.render_profile import render_profiler
 
 NONE_MARGINS = Margins(0, 0, 0, 0)
 NONE_SCALE = Scale2D(1.0, 1.0)
 
-
 def render_project(project: CursorProject, for_export=False) -> list[Image.Image]:
     if not project.is_ani_cursor:
         return [render_project_frame(project, 0, for_export)]
@@ -30,135 +33,224 @@ def render_project_gen(project: CursorProject, for_export=False):
 
 
 def render_project_frame(project: CursorProject, frame: int, for_export=False) -> Image.Image:
+    with render_profiler.span("frame", project.friendly_name):
+        return _render_project_frame(project, frame, for_export)
+
+
+def _render_project_frame(project: CursorProject, frame: int, for_export: bool) -> Image.Image:
     timer = Counter(create_start=True)
     cnt = 0
     flag_rs = False  # 指示是否直接缩放输出结果
     if not for_export:
         rs = 1 # 渲染缩放倍数
     else:
+        export_rs = export_render_scale(project)
         if not project.is_ani_cursor or config.scaled_directly:
             flag_rs = True
             rs = 1
         else:
-            rs = project.render_scale
+            rs = export_rs
     p_size = (project.raw_canvas_size[0] * rs, project.raw_canvas_size[1] * rs)
-    canvas = Image.new("RGBA", p_size, (255, 255, 255, 0))
+    use_numpy = use_numpy_compositor()
+    if use_numpy:
+        array_canvas = ArrayCanvas(p_size)
+    else:
+        canvas = Image.new("RGBA", p_size, (255, 255, 255, 0))
     for element in project.elements[::-1]:
-        # 提取元素帧
-        if element.sub_project:
-            if element.sub_project.is_ani_cursor and element.sub_project.frame_count != 0:
-                element_frames = element.sub_project.frame_count
-            else:
-                element_frames = 1
-        else:
-            element_frames = len(element.frames)
-        if frame < element.animation_start_offset:
-            continue
-        if not element.loop_animation and frame - element.animation_start_offset >= element_frames:
-            continue
-
-        if element_frames == 1:
-            frame_index = 0
-            item = element.frames[frame_index]
+        with render_profiler.span("element", element.name):
+            item = get_element_item(element, frame)
+            if item is None:
+                continue
+            layer = transform_element(element, item, rs)
+            with render_profiler.span("composite"):
+                if use_numpy:
+                    array_canvas.alpha_composite(layer_array(layer), place_element(element, layer, rs))
+                else:
+                    canvas.alpha_composite(layer.composite, place_element(element, layer, rs))
+        cnt += 1
+    with render_profiler.span("resize"):
+        if use_numpy:
+            canvas = array_canvas.to_image()
+        scaled_canvas = canvas.resize((int(canvas.width * project.scale), int(canvas.height * project.scale)),
+                                      project.resample)
+        if flag_rs:
+            scaled_canvas = scaled_canvas.resize((scaled_canvas.width * export_rs, scaled_canvas.height * export_rs),
+                                                 Image.Resampling.NEAREST)
+    if cnt == 0 and for_export:
+        scaled_canvas.putalpha(1)
+    logger.debug(f"渲染第{str(frame).zfill(2)}帧耗时: {timer.endT()}")
+    return scaled_canvas
+
+
+def render_sub_project_frame(project: CursorProject, frame: int) -> Image.Image:
+    """
+    渲染子项目的一帧, 结果按帧序号缓存在子项目上, 缓存的帧为只读
+    同一父项目渲染中多个元素引用同一子项目帧、或嵌套的子项目被多次使用时, 每个 (子项目, 帧) 只渲染一次
+    子项目或其嵌套的子项目调用 mark_changed() 后缓存失效
+    """
+    version = project.tree_version
+    cache_version, cache = project.frame_cache
+    if cache_version != version:
+        cache = {}
+        project.frame_cache = (version, cache)  # 整体替换, 其他线程读到的旧缓存不受影响
+    image = cache.get(frame)
+    if image is None:
+        with render_profiler.span("sub_project", project.friendly_name):
+            image = cache[frame] = render_project_frame(project, frame, False)
+    return image
+
+
+def get_element_item(element: CursorElement, frame: int) -> Image.Image | None:
+    """提取元素在指定帧下的源图像, 元素在该帧不显示时返回None"""
+    if element.sub_project:
+        if element.sub_project.is_ani_cursor and element.sub_project.frame_count != 0:
+            element_frames = element.sub_project.frame_count
         else:
-            if element.sub_project:
-                sub_project = element.sub_project
-                frame_index = frame - element.animation_start_offset
-                if element.sub_project.is_ani_cursor and element.sub_project.frame_count != 0:
-                    frame_index %= element.sub_project.frame_count
-                if element.reverse_animation:
-                    frame_index = element_frames - frame_index - 1
-                item = render_project_frame(sub_project, frame_index, False)
-            else:
-                temp_index = element.get_frame_index(frame)
-                frame_index = temp_index % element_frames
-                if element.reverse_animation:
-                    frame_index = element_frames - frame_index - 1
-                item = element.frames[frame_index]
-
-        # 按需填色
-        if element.mask_color is not None:
-            if hasattr(item, "raw_image"):
-                item_mask = item.raw_image
-            else:
-                item_mask = item.convert("L")
-            item = Image.new("RGBA", item.size, element.mask_color + (0,))
-            item.putalpha(item_mask)
-
-        # 按顺序进行操作
-        left_step = copy(list(element.proc_step))
-        x_off = y_off = 0
-        oper_cnt = 0
-        while len(left_step) != 0:
-            step = left_step.pop(0)
-            if step == ProcessStep.TRANSPOSE and (element.reverse_x or element.reverse_y):
-                oper_cnt += 1
-                if element.reverse_way == ReverseWay.BOTH and element.reverse_x and element.reverse_y:
-                    item = item.transpose(Transpose.TRANSPOSE)
-                    continue
-                if element.reverse_way != ReverseWay.Y_FIRST and element.reverse_x:
-                    item = item.transpose(Transpose.FLIP_LEFT_RIGHT)
-                    if element.reverse_y:
-                        item = item.transpose(Transpose.FLIP_TOP_BOTTOM)
-                if element.reverse_way != ReverseWay.X_FIRST and element.reverse_y:
-                    item = item.transpose(Transpose.FLIP_TOP_BOTTOM)
-                    if element.reverse_x:
-                        item = item.transpose(Transpose.FLIP_LEFT_RIGHT)
-
-            elif step == ProcessStep.CROP and element.crop_margins != NONE_MARGINS:
-                oper_cnt += 1
-                mrg = element.crop_margins
+            element_frames = 1
+    else:
+        element_frames = len(element.frames)
+    if frame < element.animation_start_offset:
+        return None
+    if not element.loop_animation and frame - element.animation_start_offset >= element_frames:
+        return None
+
+    if element_frames == 1:
+        return element.frames[0]
+    if element.sub_project:
+        sub_project = element.sub_project
+        frame_index = frame - element.animation_start_offset
+        if element.sub_project.is_ani_cursor and element.sub_project.frame_count != 0:
+            frame_index %= element.sub_project.frame_count
+        if element.reverse_animation:
+            frame_index = element_frames - frame_index - 1
+        return render_sub_project_frame(sub_project, frame_index)
+    return element.frames[element.get_frame_item_index(frame)]
+
+
+def place_element(element: CursorElement, layer: ElementLayer, rs: int) -> tuple[int, int]:
+    """更新元素的最终外框与图像, 返回图层在画布上的合成坐标"""
+    x_off, y_off = layer.x_off, layer.y_off
+    element.final_rect = ((element.position[0] * rs - x_off) // rs, (element.position[1] * rs - y_off) // rs,
+                          layer.image.width // rs, layer.image.height // rs)
+    element.final_image = layer.image
+    return element.position[0] * rs - x_off, element.position[1] * rs - y_off
+
+
+def layer_array(layer: ElementLayer):
+    if layer.array is None:
+        layer.array = masked_array(layer.composite, None, False)
+    return layer.array
+
+
+def transform_element(element: CursorElement, item: Image.Image, rs: int) -> ElementLayer:
+    """对元素帧进行填色、变换与遮罩, 结果存入变换缓存 (子项目帧在其缓存有效期间是同一图像, 同样可以命中)"""
+    params = TransformParams.of(element)
+    key = transform_cache.make_key(params, item, rs)
+    layer = transform_cache.get(key)
+    if layer is None:
+        with render_profiler.span("transform"):
+            layer = _transform_element(params, item, rs)
+        layer.refs = (item, params.mask)
+        transform_cache.put(key, layer)
+    return layer
+
+
+def _transform_element(params: TransformParams, item: Image.Image, rs: int) -> ElementLayer:
+    use_numpy = use_numpy_compositor()
+    # 按需填色
+    if params.mask_color is not None:
+        with render_profiler.span("tint"):
+            item = tint_item(params, item, use_numpy)
+
+    # 按顺序进行操作
+    left_step = copy(list(params.proc_step))
+    x_off = y_off = 0
+    while len(left_step) != 0:
+        step = left_step.pop(0)
+        if step == ProcessStep.TRANSPOSE and (params.reverse_x or params.reverse_y):
+            with render_profiler.span(f"step:{step.name}"):
+                item = transpose_item(params, item)
+
+        elif step == ProcessStep.CROP and params.crop_margins != NONE_MARGINS:
+            with render_profiler.span(f"step:{step.name}"):
+                mrg = params.crop_margins
                 item = item.crop(
                     (mrg.left * rs, mrg.up * rs, (item.width - mrg.right) * rs, (item.height - mrg.down) * rs))
 
-            elif step == ProcessStep.SCALE and (element.scale != NONE_SCALE or rs != 1):
-                oper_cnt += 1
-                item = item.resize((int(item.width * element.scale[0]) * rs,
-                                    int(item.height * element.scale[1]) * rs),
-                                   element.scale_resample)
+        elif step == ProcessStep.SCALE and (params.scale != NONE_SCALE or rs != 1):
+            with render_profiler.span(f"step:{step.name}"):
+                item = item.resize((int(item.width * params.scale[0]) * rs,
+                                    int(item.height * params.scale[1]) * rs),
+                                   params.scale_resample)
 
-            elif step == ProcessStep.ROTATE and element.rotation != 0:
-                oper_cnt += 1
+        elif step == ProcessStep.ROTATE and params.rotation != 0:
+            with render_profiler.span(f"step:{step.name}"):
                 size = item.size
-                rotate_resample = element.resample
+                rotate_resample = params.resample
                 if rotate_resample not in (Resampling.NEAREST, Resampling.BILINEAR, Resampling.BICUBIC):
                     rotate_resample = Resampling.NEAREST
-                item = item.rotate(element.rotation, rotate_resample, expand=True,
+                item = item.rotate(params.rotation, rotate_resample, expand=True,
                                    center=(size[0] // 2 * rs, size[1] // 2 * rs))
-                if element.rotation % 90 == 0:
+                if params.rotation % 90 == 0:
                     x_off = y_off = 0
                 else:
                     x_off, y_off = (item.width - size[0]) // 2, (item.height - size[1]) // 2
 
-        element.final_rect = ((element.position[0] * rs - x_off) // rs, (element.position[1] * rs - y_off) // rs,
-                              item.width // rs, item.height // rs)
-        element.final_image = item.copy()
-        if oper_cnt == 0:
-            item = item.copy()
-        if element.mask is not None and element.mask.size != item.size and element.allow_mask_scale:
-            mask = element.mask.resize(item.size, element.scale_resample)
-        else:
-            mask = element.mask
-            if mask is not None and rs != 1:
-                mask = mask.resize((mask.width * rs, mask.height * rs), element.scale_resample)
-        if element.sub_project:
-            if mask is not None and mask.size == item.size:
-                orig_mask = item.getchannel("A")
-                new_mask = Image.new("L", orig_mask.size, 0)
-                new_mask.paste(orig_mask, mask)
-                item.putalpha(new_mask)
-            canvas.alpha_composite(item, (element.position[0] * rs - x_off, element.position[1] * rs - y_off))
+    if params.mask is None:
+        return make_layer(params, item, None, x_off, y_off, use_numpy)
+    with render_profiler.span("mask"):
+        if params.mask.size != item.size and params.allow_mask_scale:
+            mask = params.mask.resize(item.size, params.scale_resample)
         else:
-            if mask and mask.size == item.size:
-                item.putalpha(mask)
-            canvas.alpha_composite(item, (element.position[0] * rs - x_off, element.position[1] * rs - y_off))
-        cnt += 1
-    scaled_canvas = canvas.resize((int(canvas.width * project.scale), int(canvas.height * project.scale)),
-                                  project.resample)
-    if flag_rs:
-        scaled_canvas = scaled_canvas.resize((scaled_canvas.width * project.render_scale, scaled_canvas.height * project.render_scale),
-                                             Image.Resampling.NEAREST)
-    if cnt == 0 and for_export:
-        scaled_canvas.putalpha(1)
-    logger.debug(f"渲染第{str(frame).zfill(2)}帧耗时: {timer.endT()}")
-    return scaled_canvas
+            mask = params.mask
+            if rs != 1:
+                mask = mask.resize((mask.width * rs, mask.height * rs), params.scale_resample)
+        return make_layer(params, item, mask, x_off, y_off, use_numpy)
+
+
+def tint_item(params: TransformParams, item: Image.Image, use_numpy: bool) -> Image.Image:
+    if use_numpy:
+        return tint_image(item, params.mask_color)
+    if hasattr(item, "raw_image"):
+        item_mask = item.raw_image
+    else:
+        item_mask = item.convert("L")
+    item = Image.new("RGBA", item.size, params.mask_color + (0,))
+    item.putalpha(item_mask)
+    return item
+
+
+def transpose_item(params: TransformParams, item: Image.Image) -> Image.Image:
+    if params.reverse_way == ReverseWay.BOTH and params.reverse_x and params.reverse_y:
+        return item.transpose(Transpose.TRANSPOSE)
+    if params.reverse_way != ReverseWay.Y_FIRST and params.reverse_x:
+        item = item.transpose(Transpose.FLIP_LEFT_RIGHT)
+        if params.reverse_y:
+            item = item.transpose(Transpose.FLIP_TOP_BOTTOM)
+    if params.reverse_way != ReverseWay.X_FIRST and params.reverse_y:
+        item = item.transpose(Transpose.FLIP_TOP_BOTTOM)
+        if params.reverse_x:
+            item = item.transpose(Transpose.FLIP_LEFT_RIGHT)
+    return item
+
+
+def make_layer(params: TransformParams, item: Image.Image, mask: Image.Image | None,
+               x_off: int, y_off: int, use_numpy: bool) -> ElementLayer:
+    """应用遮罩, 生成用于合成的图层"""
+    if use_numpy:
+        array = masked_array(item, mask, params.is_sub_project)
+        composite = Image.fromarray(array, "RGBA") if mask is not None and mask.size == item.size else item
+        return ElementLayer(item, composite, x_off, y_off, array=array)
+    composite = item
+    if params.is_sub_project:
+        if mask is not None and mask.size == item.size:
+            orig_mask = item.getchannel("A")
+            new_mask = Image.new("L", orig_mask.size, 0)
+            new_mask.paste(orig_mask, mask)
+            composite = item.copy()
+            composite.putalpha(new_mask)
+    else:
+        if mask and mask.size == item.size:
+            composite = item.copy()
+            composite.putalpha(mask)
+    return ElementLayer(item, composite, x_off, y_off)
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Hashable
+
+from PIL import Image
+
+from lib.config import config
+from lib.data import CursorElement, ProcessStep, ReverseWay, Margins, Scale2D
+from lib.log import logger
+
+
+@dataclass
+class ElementLayer:
+    """元素经过变换后的图层, 缓存内的图像为只读, 请勿原地修改"""
+    image: Image.Image  # 变换后、应用遮罩前的图像
+    composite: Image.Image  # 应用遮罩后, 直接用于合成的图像
+    x_off: int
+    y_off: int
+    refs: tuple[Any, ...] = ()  # 持有键中以id()标识的对象, 保证id在缓存存活期间不被复用
+    array: Any = None  # NumPy合成引擎使用的composite数组, 按需生成
+
+    @property
+    def nbytes(self) -> int:
+        size = image_nbytes(self.image)
+        if self.composite is not self.image:
+            size += image_nbytes(self.composite)
+        if self.array is not None:
+            size += self.array.nbytes
+        return size
+
+
+def image_nbytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+@dataclass(frozen=True, eq=False)
+class TransformParams:
+    """
+    元素变换参数的快照, 缓存键与变换结果都由同一快照得出
+    后台预渲染时主线程可能正在修改元素, 直接读取元素会把新参数的变换结果存入旧参数的键下
+    """
+    mask_color: tuple[int, int, int] | None
+    proc_step: tuple[ProcessStep, ...]
+    reverse_x: bool
+    reverse_y: bool
+    reverse_way: ReverseWay
+    crop_margins: Margins
+    scale: Scale2D
+    scale_resample: Image.Resampling
+    rotation: float
+    resample: Image.Resampling
+    mask: Image.Image | None
+    allow_mask_scale: bool
+    is_sub_project: bool
+
+    @classmethod
+    def of(cls, element: CursorElement) -> 'TransformParams':
+        return cls(
+            element.mask_color,
+            tuple(element.proc_step),
+            element.reverse_x,
+            element.reverse_y,
+            element.reverse_way,
+            Margins.load(element.crop_margins.save()),  # 编辑时原地修改字段, 需复制
+            Scale2D.load(element.scale.save()),
+            element.scale_resample,
+            element.rotation,
+            element.resample,
+            element.mask,
+            element.allow_mask_scale,
+            element.sub_project is not None,
+        )
+
+
+class ElementTransformCache:
+    """元素变换结果的LRU缓存, 以元素的变换参数、遮罩与源帧为键, 按占用字节数淘汰"""
+
+    def __init__(self):
+        self.layers: OrderedDict[Hashable, tuple[ElementLayer, int]] = OrderedDict()  # 键 -> (图层, 存入时的字节数)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    @property
+    def max_bytes(self) -> int:
+        return int(config.render_cache_size * 1024 * 1024)
+
+    @staticmethod
+    def make_key(params: TransformParams, item: Image.Image, rs: int) -> tuple:
+        """根据元素变换参数的快照生成缓存键, 与元素位置无关"""
+        return (
+            id(item),
+            params.mask_color,
+            params.proc_step,
+            params.reverse_x,
+            params.reverse_y,
+            params.reverse_way,
+            tuple(params.crop_margins.save()),
+            tuple(params.scale.save()),
+            params.scale_resample,
+            params.rotation,
+            params.resample,
+            id(params.mask),
+            params.allow_mask_scale,
+            params.is_sub_project,
+            rs,
+        )
+
+    def get(self, key: Hashable) -> ElementLayer | None:
+        with self.lock:
+            entry = self.layers.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.layers.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, layer: ElementLayer):
+        nbytes = layer.nbytes
+        max_bytes = self.max_bytes
+        if nbytes > max_bytes:
+            return
+        with self.lock:
+            if key in self.layers:
+                self.total_bytes -= self.layers.pop(key)[1]
+            self.layers[key] = (layer, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > max_bytes:
+                _, (_, old_nbytes) = self.layers.popitem(last=False)
+                self.total_bytes -= old_nbytes
+
+    def clear(self):
+        with self.lock:
+            self.layers.clear()
+            self.total_bytes = 0
+        logger.debug("元素变换缓存已清空")
+
+    def __len__(self):
+        return len(self.layers)
+
+
+transform_cache = ElementTransformCache()
@@ -0,0 +1,135 @@
+from math import ceil, floor
+
+from PIL import Image
+from PIL.Image import Resampling
+
+from lib.data import CursorProject, CursorElement
+from lib.render import get_element_item, transform_element, place_element
+from lib.render_cache import ElementLayer
+
+Rect = tuple[int, int, int, int]  # 左, 上, 右, 下
+FILTER_SUPPORT = {  # 各重采样滤波的半径 (源图像像素, 缩小时按缩小倍数放大)
+    Resampling.NEAREST: 0.5,
+    Resampling.BOX: 0.5,
+    Resampling.BILINEAR: 1.0,
+    Resampling.HAMMING: 1.0,
+    Resampling.BICUBIC: 2.0,
+    Resampling.LANCZOS: 3.0,
+}
+
+
+def union_rect(rect1: Rect | None, rect2: Rect | None) -> Rect | None:
+    if rect1 is None:
+        return rect2
+    if rect2 is None:
+        return rect1
+    return min(rect1[0], rect2[0]), min(rect1[1], rect2[1]), max(rect1[2], rect2[2]), max(rect1[3], rect2[3])
+
+
+def clip_rect(rect: Rect | None, size: tuple[int, int]) -> Rect | None:
+    if rect is None:
+        return None
+    rect = max(rect[0], 0), max(rect[1], 0), min(rect[2], size[0]), min(rect[3], size[1])
+    if rect[0] >= rect[2] or rect[1] >= rect[3]:
+        return None
+    return rect
+
+
+def patch_resized(source: Image.Image, target: Image.Image, dirty: Rect, resample: Resampling) -> Rect | None:
+    """
+    source 的 dirty 区域改变后, 只重新缩放 target (source 缩放后的图像) 中受影响的区域, 返回 target 中被更新的区域
+    滤波会用到相邻像素, 区域按滤波半径向外扩展, 并通过 box 参数按整图的采样位置缩放
+    缩放倍数无法用二进制精确表示时, 采样位置的浮点舍入可能与整图缩放略有不同 (仅用于预览)
+    """
+    if source.size == target.size:  # 与 resize 一致, 尺寸不变时直接复制
+        target.paste(source.crop(dirty), dirty[:2])
+        return dirty
+    rx, ry = source.width / target.width, source.height / target.height
+    support = FILTER_SUPPORT.get(resample, 3.0)
+    mx, my = support * max(rx, 1), support * max(ry, 1)
+    rect = clip_rect((floor((dirty[0] - mx) / rx) - 1, floor((dirty[1] - my) / ry) - 1,
+                      ceil((dirty[2] + mx) / rx) + 1, ceil((dirty[3] + my) / ry) + 1), target.size)
+    if rect is None:
+        return None
+    region = source.resize((rect[2] - rect[0], rect[3] - rect[1]), resample,
+                           box=(rect[0] * rx, rect[1] * ry, rect[2] * rx, rect[3] * ry))
+    target.paste(region, rect[:2])
+    return rect
+
+
+class IncrementalFrame:
+    """
+    拖动单个元素时的增量合成器 (仅用于编辑器预览)
+    将活动元素下方与上方的元素分别预先合成为两个图层,
+    元素每次移动只重新混合新旧外框的并集区域, 并只重新缩放项目缩放与各显示缩放下的对应区域, 耗时只与元素大小有关
+    预合成的上方图层与逐个合成存在舍入误差, 拖动结束后应重新完整渲染
+    """
+
+    def __init__(self, project: CursorProject, frame: int, element: CursorElement):
+        self.project = project
+        self.element = element
+        size = project.raw_canvas_size
+        self.below = Image.new("RGBA", size, (255, 255, 255, 0))
+        self.above = Image.new("RGBA", size, (255, 255, 255, 0))
+        self.layer: ElementLayer | None = None
+
+        target = self.below
+        for crt_element in project.elements[::-1]:
+            if crt_element is element:
+                target = self.above
+                item = get_element_item(crt_element, frame)
+                if item is not None:
+                    self.layer = transform_element(crt_element, item, 1)
+                continue
+            item = get_element_item(crt_element, frame)
+            if item is None:
+                continue
+            layer = transform_element(crt_element, item, 1)
+            target.alpha_composite(layer.composite, place_element(crt_element, layer, 1))
+
+        self.canvas = self.below.copy()
+        self.last_rect = self.place_layer()
+        if self.last_rect:
+            self.canvas.alpha_composite(self.layer.composite, self.last_rect[:2])
+        self.canvas.alpha_composite(self.above)
+        self.scaled = self.canvas.resize((int(self.canvas.width * project.scale),
+                                          int(self.canvas.height * project.scale)), project.resample)
+        self.views: dict[float, Image.Image] = {}  # 显示缩放 -> 按显示缩放再次缩放的帧
+
+    def place_layer(self) -> Rect | None:
+        if self.layer is None:
+            return None
+        x, y = place_element(self.element, self.layer, 1)
+        return x, y, x + self.layer.composite.width, y + self.layer.composite.height
+
+    def update(self):
+        """按元素的当前位置重新混合脏区域"""
+        rect = self.place_layer()
+        if rect == self.last_rect:
+            return
+        dirty = clip_rect(union_rect(self.last_rect, rect), self.canvas.size)
+        self.last_rect = rect
+        if dirty is None:
+            return
+        region = self.below.crop(dirty)
+        region.alpha_composite(self.layer.composite, (rect[0] - dirty[0], rect[1] - dirty[1]))
+        region.alpha_composite(self.above.crop(dirty))
+        self.canvas.paste(region, dirty[:2])
+        scaled_dirty = patch_resized(self.canvas, self.scaled, dirty, self.project.resample)
+        if scaled_dirty is None:
+            return
+        for view in self.views.values():
+            patch_resized(self.scaled, view, scaled_dirty, Resampling.BOX)
+
+    def render(self) -> Image.Image:
+        """返回按项目缩放后的帧, 与 render_project_frame(project, frame) 的输出对应, 返回的图像会被后续移动原地修改"""
+        self.update()
+        return self.scaled
+
+    def view(self, scale: float) -> Image.Image:
+        """返回按显示缩放 (BOX) 再次缩放的帧, 之后的移动只修补其中的脏区域, 返回的图像会被原地修改"""
+        self.update()
+        if scale not in self.views:
+            self.views[scale] = self.scaled.resize((int(self.scaled.width * scale), int(self.scaled.height * scale)),
+                                                   Resampling.BOX)
+        return self.views[scale]
@@ -0,0 +1,91 @@
+from concurrent.futures import ProcessPoolExecutor, Future
+from math import ceil
+from os import cpu_count
+from typing import Any, Iterator
+
+from PIL import Image
+
+from lib.config import config
+from lib.data import CursorProject
+from lib.log import logger
+from lib.render import render_project_frame
+
+# 工作进程内的状态
+_worker_projects_data: list[dict[str, Any]] = []
+_worker_projects: dict[int, CursorProject] = {}
+
+
+def _init_worker(projects_data: list[dict[str, Any]], scaled_directly: bool, multi_size_cursors: bool):
+    global _worker_projects_data
+    _worker_projects_data = projects_data
+    _worker_projects.clear()
+    config.scaled_directly = scaled_directly  # 与主进程内存中的配置保持一致
+    config.multi_size_cursors = multi_size_cursors  # 决定导出时的渲染缩放
+
+
+def _render_range(index: int, frames: range, for_export: bool) -> list[Image.Image]:
+    project = _worker_projects.get(index)
+    if project is None:  # 每个工作进程只反序列化一次项目
+        project = CursorProject.from_dict(_worker_projects_data[index])
+        _worker_projects[index] = project
+    return [render_project_frame(project, frame, for_export) for frame in frames]
+
+
+def get_render_workers() -> int:
+    return max(1, config.render_workers or cpu_count() or 1)
+
+
+class ProcessRenderer:
+    """
+    多进程渲染器
+    创建时将所有项目以 to_dict() 的形式一次性发送至工作进程, 之后按帧区间并行渲染
+    """
+
+    def __init__(self, projects: list[CursorProject], workers: int | None = None):
+        self.projects = projects
+        self.workers = workers if workers else get_render_workers()
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=([project.to_dict() for project in projects],
+                                                      config.scaled_directly, config.multi_size_cursors))
+        self.tasks: dict[tuple[int, bool], list[Future]] = {}
+        logger.debug(f"多进程渲染器已启动, 进程数: {self.workers}, 项目数: {len(projects)}")
+
+    def submit(self, index: int, for_export: bool = False) -> list[Future]:
+        """提交一个项目的所有帧, 重复提交不会重复渲染"""
+        key = (index, for_export)
+        if key not in self.tasks:
+            project = self.projects[index]
+            frames = range(project.frame_count) if project.is_ani_cursor else range(1)
+            chunk_size = max(1, ceil(len(frames) / (self.workers * 2)))
+            self.tasks[key] = [self.executor.submit(_render_range, index, frames[i:i + chunk_size], for_export)
+                               for i in range(0, len(frames), chunk_size)]
+        return self.tasks[key]
+
+    def render_gen(self, index: int, for_export: bool = False) -> Iterator[Image.Image]:
+        """按顺序逐帧产出渲染结果, 与 render_project_gen 的产出一致"""
+        for future in self.submit(index, for_export):
+            yield from future.result()
+        self.tasks.pop((index, for_export), None)
+
+    def render(self, index: int, for_export: bool = False) -> list[Image.Image]:
+        return list(self.render_gen(index, for_export))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def render_project_parallel_gen(project: CursorProject, for_export: bool = False,
+                                workers: int | None = None) -> Iterator[Image.Image]:
+    with ProcessRenderer([project], workers) as renderer:
+        yield from renderer.render_gen(0, for_export)
+
+
+def render_project_parallel(project: CursorProject, for_export: bool = False,
+                            workers: int | None = None) -> list[Image.Image]:
+    return list(render_project_parallel_gen(project, for_export, workers))
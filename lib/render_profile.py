@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import nullcontext
+from os.path import join
+from time import perf_counter, strftime
+from typing import Any
+
+from lib.config import config
+from lib.log import logger
+
+HISTOGRAM_BOUNDS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)  # 毫秒, 桶的上界
+MAX_TRACE_EVENTS = 200000  # 保留的跨度事件上限, 超出后只统计直方图
+NULL_SPAN = nullcontext()
+
+
+class SpanStats:
+    """同名跨度的耗时直方图"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(HISTOGRAM_BOUNDS, seconds * 1000)] += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS] + [f">{HISTOGRAM_BOUNDS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class Span:
+    def __init__(self, profiler: 'RenderProfiler', name: str, detail: str | None):
+        self.profiler = profiler
+        self.name = name
+        self.label = name if detail is None else f"{name}:{detail.replace(';', ',')}"  # 分号为折叠栈的分隔符
+        self.start = 0.0
+
+    def __enter__(self):
+        self.profiler.push(self.label)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.record(self, perf_counter() - self.start)
+
+
+class RenderProfiler:
+    """
+    渲染过程的计时跨度 (帧、元素、处理步骤、遮罩、子项目与最终缩放)
+    跨度按名称汇总为耗时直方图, 按调用栈汇总为火焰图数据, 并保留原始事件用于时间线
+    未启用时 span() 直接返回空上下文, 不影响渲染耗时; 只记录当前进程内的渲染
+    """
+
+    def __init__(self):
+        self.enabled = config.render_profiling
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.origin = perf_counter()
+        self.stats: dict[str, SpanStats] = defaultdict(SpanStats)
+        self.stacks: dict[str, float] = defaultdict(float)  # 调用栈 -> 自身耗时 (不含子跨度)
+        self.events: list[tuple[str, str, float, float, int]] = []  # (名称, 标签, 开始, 耗时, 线程ID)
+
+    def span(self, name: str, detail: Any = None):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, None if detail is None else str(detail))
+
+    def push(self, label: str):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+            self.local.child_times = []  # 每层跨度的子跨度耗时之和, 用于计算自身耗时
+        self.local.stack.append(label)
+        self.local.child_times.append(0.0)
+
+    def record(self, span: Span, seconds: float):
+        stack, child_times = self.local.stack, self.local.child_times
+        path = ";".join(stack)
+        self_time = seconds - child_times.pop()
+        stack.pop()
+        if child_times:
+            child_times[-1] += seconds
+        with self.lock:
+            self.stats[span.name].add(seconds)
+            self.stacks[path] += self_time
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append((span.name, span.label, span.start - self.origin, seconds,
+                                    threading.get_ident()))
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.stacks.clear()
+            self.events.clear()
+            self.origin = perf_counter()
+
+    def summary(self) -> dict[str, Any]:
+        """按跨度名称汇总的直方图, 以总耗时降序排列"""
+        with self.lock:
+            items = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)
+            return {name: stats.to_dict() for name, stats in items}
+
+    def collapsed_stacks(self) -> str:
+        """flamegraph.pl / speedscope 可读取的折叠栈格式, 数值为自身耗时 (微秒)"""
+        with self.lock:
+            return "".join(f"{path} {round(seconds * 1e6)}\n" for path, seconds in self.stacks.items()
+                           if round(seconds * 1e6) > 0)
+
+    def trace(self) -> dict[str, Any]:
+        """Chrome Trace Event 格式, 可在 chrome://tracing 或 Perfetto 中查看时间线与火焰图"""
+        with self.lock:
+            events = [{"name": label, "cat": name, "ph": "X", "pid": os.getpid(), "tid": tid,
+                       "ts": start * 1e6, "dur": seconds * 1e6}
+                      for name, label, start, seconds, tid in self.events]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, dir_path: str) -> str:
+        """将直方图 (JSON)、折叠栈与时间线保存至 dir_path, 返回文件名前缀"""
+        prefix = join(dir_path, strftime("render_%Y%m%d_%H%M%S"))
+        with open(prefix + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        with open(prefix + ".folded", "w", encoding="utf-8") as f:
+            f.write(self.collapsed_stacks())
+        with open(prefix + ".trace.json", "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f, ensure_ascii=False)
+        logger.info(f"渲染性能数据已保存: {prefix}")
+        return prefix
+
+
+render_profiler = RenderProfiler()
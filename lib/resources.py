@@ -4,32 +4,39 @@ import re
 import time
 import typing
 import zlib
+from concurrent.futures import Future
 from dataclasses import dataclass
 from enum import Enum
+from functools import partial
+from hashlib import blake2b
 from io import BytesIO
 from os import rename
 from os.path import join, basename, isfile, dirname, split, isdir, expandvars
 from shutil import copytree, rmtree
-from threading import Event, Thread
+from threading import Event, Thread, Lock
 from typing import Callable, Any
 from zipfile import ZipFile, ZIP_DEFLATED, ZipInfo
 
 from lib.config import config
 from lib.data import CursorTheme, path_theme_data, CursorElement, \
-    AssetSourceInfo, AssetType, path_deleted_theme_data
+    AssetSourceInfo, AssetType, path_deleted_theme_data, LazyCursorTheme, CursorProject
 from lib.datas.base_struct import generate_id
 from lib.datas.data_dir import path_user_sources
+from lib.datas.image_blob import ImageBlobWriter, ImageBlobReader
 from lib.datas.source import SourceNotFoundError, AssetSource, source_manager, SourceFileMissingError
 from lib.log import logger
 from lib.perf import Counter
 from lib.render import render_project_frame
+from lib.theme_writer import ThemeSnapshot, theme_writer
 
 HEX_PATTERN = re.compile("^#([A-Fa-f0-9]+)$")
+TEMP_SUFFIX = ".saving"
 
 
 class ThemeAction(Enum):
     ADD = 0
     DELETE = 2
+    LOAD_FAILED = 3  # 懒加载主题的项目加载失败, 主题已被移出列表 (回调可能在任意线程调用)
 
 
 def get_dir_all_themes(dir_path: str):
@@ -97,6 +104,7 @@ class ThemeFileType(Enum):
     RAW_JSON = 0
     ZIP_COMPRESS = "zip_compress"
     ZIP_FILE = "zip_file"
+    BLOB_CONTAINER = "blob_container"  # 结构数据与去重的图像块分开保存, 保存时不重新编码未改变的图像
 
 
 @dataclass
@@ -123,6 +131,8 @@ class ThemeManager:
         self.root_dir = dir_path
         self.themes: list[CursorTheme] = []
         self.theme_file_mapping: dict[CursorTheme, str] = {}
+        self.saved_digests: dict[CursorTheme, str] = {}  # 主题 -> 上次保存时结构数据的哈希, 用于跳过未修改的主题
+        self.file_lock = Lock()  # 保存线程与界面线程对主题文件的操作互斥
         self.callbacks: dict[ThemeAction, list[Callable[[CursorTheme], None]]] = {}
         self.load()
 
@@ -135,7 +145,11 @@ class ThemeManager:
         _, _, file_names = next(os.walk(self.root_dir))
         for file_name in file_names:
             file_path = str(join(self.root_dir, file_name))
-            self.load_theme(file_path)
+            if file_name.endswith(TEMP_SUFFIX):  # 上次保存中断留下的临时文件, 原文件未被改动
+                os.remove(file_path)
+                continue
+            if not (config.lazy_load_themes and self.load_lazy_theme(file_path)):
+                self.load_theme(file_path)
         logger.info(f"主题加载完毕, 用时: {timer.endT()}")
 
     def live_save(self):
@@ -159,13 +173,35 @@ class ThemeManager:
         self.save_themes(self.themes)
 
     def save_themes(self, themes: list[CursorTheme]):
-        themes_id_mapping = get_dir_all_themes(self.root_dir)
-        for theme in themes:
-            if theme.id in themes_id_mapping:
-                os.remove(themes_id_mapping[theme.id])
-            file_path = str(join(self.root_dir, f"MineCursor Theme_{theme.id}_{theme.name}.mctheme"))
+        """在当前线程获取主题快照, 序列化与写入交给后台保存线程"""
+        for theme in list(themes):  # 项目加载失败的主题会在遍历中被移出列表
+            if isinstance(theme, LazyCursorTheme):
+                if not theme.hydrated and not theme.header_changed:
+                    continue  # 项目未加载且信息未修改, 文件内容无需更新
+                theme.hydrate()
+                if theme.hydrate_failed:
+                    continue
+            snapshot = ThemeSnapshot(theme, use_blobs=True)
+            theme_writer.submit(partial(self.write_saved_theme, theme, snapshot))
+
+    def write_saved_theme(self, theme: CursorTheme, snapshot: ThemeSnapshot):
+        """(保存线程) 只写入内容或文件名发生变化的主题"""
+        serialized = snapshot.serialize()
+        digest = self.digest_serialized(serialized)
+        file_path = str(join(self.root_dir, f"MineCursor Theme_{snapshot.id}_{snapshot.name}.mctheme"))
+        with self.file_lock:
+            if theme not in self.themes:  # 快照获取后主题已被移除
+                return
+            old_path = self.theme_file_mapping.get(theme)
+            if old_path is None:  # 新添加的主题, 目录中可能存在同ID的旧文件
+                old_path = get_dir_all_themes(self.root_dir).get(theme.id)
+            if self.saved_digests.get(theme) == digest and old_path == file_path and isfile(file_path):
+                return
+            self.write_theme_snapshot(file_path, snapshot, ThemeFileType.BLOB_CONTAINER, serialized=serialized)
+            if old_path and old_path != file_path and isfile(old_path):  # 新文件写入完成后再删除旧文件
+                os.remove(old_path)
             self.theme_file_mapping[theme] = file_path
-            self.save_theme_file(file_path, theme)
+            self.saved_digests[theme] = digest
 
     def load_theme(self, file_path: str, refresh_id: bool = False, file_mapping: bool = True) -> ThemeLoadInfo | None:
         try:
@@ -183,25 +219,108 @@ class ThemeManager:
         self.add_theme(theme)
         if file_mapping:
             self.theme_file_mapping[theme] = file_path
+            self.record_saved(theme, info.file_type)
         info.theme = theme
         return info
 
+    def load_lazy_theme(self, file_path: str) -> LazyCursorTheme | None:
+        """只读取主题的头信息并添加主题, 项目在首次访问时加载, 不支持懒加载的主题文件返回None"""
+        header = self.load_theme_header(file_path)
+        if header is None:
+            return None
+        theme = LazyCursorTheme(header, self.hydrate_theme)
+        logger.debug(f"已读取主题信息: {theme}")
+        self.add_theme(theme)
+        self.theme_file_mapping[theme] = file_path
+        return theme
+
+    def hydrate_theme(self, theme: LazyCursorTheme) -> list[CursorProject]:
+        """从主题当前对应的文件加载懒加载主题的项目"""
+        file_path = self.theme_file_mapping[theme]
+        try:
+            full_theme, info = self.load_theme_file(file_path)
+        except SourceNotFoundError as e:
+            logger.warning(f"主题 [{file_path}] 中ID为 [{e.source_id}] 的源不存在")
+        except SourceFileMissingError as e:
+            logger.warning(f"主题 [{file_path}] 中ID为 [{e.source_id}] 的源缺少 [{e.file_path}] 文件")
+        else:
+            logger.info(f"已加载主题项目: {theme}")
+            self.record_saved(full_theme, info.file_type)
+            return full_theme.projects
+        theme.hydrate_failed = True  # 保存时跳过, 以免空项目列表覆盖原文件
+        self.unload_theme(theme)
+        return []
+
+    def unload_theme(self, theme: CursorTheme):
+        """
+        将项目加载失败的主题移出列表, 主题文件保留 (与非懒加载时跳过缺少源的主题一致)
+        留在列表中的空主题可以被编辑却无法保存, 修改会在不知不觉中丢失
+        """
+        logger.warning(f"主题 [{theme}] 的项目加载失败, 已移出主题列表")
+        with self.file_lock:
+            self.theme_file_mapping.pop(theme, None)
+            self.saved_digests.pop(theme, None)
+            if theme in self.themes:
+                self.themes.remove(theme)
+        self.call_callback(ThemeAction.LOAD_FAILED, theme)
+
+    def record_saved(self, theme: CursorTheme, file_type: ThemeFileType):
+        """记录刚从文件加载的主题的哈希, 旧格式的文件不记录, 下次保存时转换为新格式"""
+        if file_type == ThemeFileType.BLOB_CONTAINER:  # 图像块已由读取器缓存, 序列化无需重新编码
+            self.saved_digests[theme] = self.digest_serialized(ThemeSnapshot(theme, use_blobs=True).serialize())
+
+    @staticmethod
+    def digest_serialized(serialized: tuple[str, ImageBlobWriter | None]) -> str:
+        return blake2b(serialized[0].encode("utf-8"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def read_file_header(data_io: typing.BinaryIO) -> dict[str, Any] | None:
+        """读取MCTF主题文件的头, 非MCTF文件返回None并回到文件开头"""
+        if data_io.read(4) != ThemeManager.MCTF:
+            data_io.seek(0)
+            return None
+        data_io.read(int.from_bytes(data_io.read(4), "little"))  # 读取并丢弃头文本
+
+        header_length = int.from_bytes(data_io.read(8), "little")
+        return json.loads(data_io.read(header_length))
+
+    @staticmethod
+    def load_theme_header(file_path: str) -> dict[str, Any] | None:
+        """
+        读取主题信息 (不含项目) 及项目数量, ZIP_FILE类型的主题需要导入素材库, 不支持只读取信息, 返回None
+        新版本的主题文件在文件头中保存了主题信息, 旧版本的主题文件则只解析JSON而不构建项目
+        """
+        with open(file_path, "rb") as data_io:
+            header = ThemeManager.read_file_header(data_io)
+            if header is None:
+                data = json.loads(data_io.read().decode("utf-8"))
+            elif ThemeFileType(header["type"]) not in (ThemeFileType.ZIP_COMPRESS, ThemeFileType.BLOB_CONTAINER):
+                return None
+            elif "theme" in header:
+                return header["theme"]
+            else:
+                data_length = int.from_bytes(data_io.read(8), "little")
+                data = json.loads(zlib.decompress(data_io.read(data_length)).decode("utf-8"))
+        data["project_count"] = len(data.pop("projects"))
+        return data
+
     @staticmethod
     def load_theme_file(file_path: str) -> tuple[CursorTheme | dict, ThemeLoadInfo]:
         """从一个MineCursor主题文件加载主题"""
         info = ThemeLoadInfo()
+        blobs = None
         with open(file_path, "rb") as data_io:
-            if data_io.read(4) == ThemeManager.MCTF:
-                data_io.read(int.from_bytes(data_io.read(4), "little"))  # 读取并丢弃头文本
-
-                header_length = int.from_bytes(data_io.read(8), "little")
-                header: dict[str, Any] = json.loads(data_io.read(header_length))
-
+            header = ThemeManager.read_file_header(data_io)
+            if header is not None:
                 data_length = int.from_bytes(data_io.read(8), "little")
                 file_type = ThemeFileType(header["type"])
                 info.file_type = file_type
                 if file_type == ThemeFileType.ZIP_COMPRESS:
                     theme_data = zlib.decompress(data_io.read(data_length)).decode("utf-8")
+                elif file_type == ThemeFileType.BLOB_CONTAINER:
+                    theme_data = zlib.decompress(data_io.read(data_length)).decode("utf-8")
+                    table_length = int.from_bytes(data_io.read(8), "little")
+                    blobs = ImageBlobReader(json.loads(zlib.decompress(data_io.read(table_length))), data_io.read())
                 elif file_type == ThemeFileType.ZIP_FILE:
                     zip_io = BytesIO(data_io.read(data_length))
                     with ZipFile(zip_io, "r") as zip_file:
@@ -213,49 +332,80 @@ class ThemeManager:
                     raise RuntimeError(f"无法加载主题: {file_path}, 未知的主题类型")
             else:
                 info.file_type = ThemeFileType.RAW_JSON
-                data_io.seek(0)
                 theme_data = data_io.read().decode("utf-8")
-        return CursorTheme.from_dict(json.loads(theme_data)), info
+        return CursorTheme.from_dict(json.loads(theme_data), blobs), info
 
     @staticmethod
     def save_theme_file(file_path: str, theme: CursorTheme, file_type: ThemeFileType = ThemeFileType.ZIP_COMPRESS,
                         extra_sources: list[AssetSource] | None = None):
-        """保存主题到一个MineCursor主题文件"""
+        """保存主题到一个MineCursor主题文件, 在当前线程完成写入"""
+        snapshot = ThemeSnapshot(theme, use_blobs=file_type == ThemeFileType.BLOB_CONTAINER)
+        ThemeManager.write_theme_snapshot(file_path, snapshot, file_type, extra_sources)
+
+    @staticmethod
+    def submit_theme_file(file_path: str, theme: CursorTheme, file_type: ThemeFileType = ThemeFileType.ZIP_COMPRESS,
+                          extra_sources: list[AssetSource] | None = None) -> Future:
+        """获取主题快照后交给后台保存线程写入, 不等待写入完成, 通过返回的 Future 获取写入结果"""
+        snapshot = ThemeSnapshot(theme, use_blobs=file_type == ThemeFileType.BLOB_CONTAINER)
+        return theme_writer.submit(partial(ThemeManager.write_theme_snapshot, file_path, snapshot, file_type, extra_sources))
+
+    @staticmethod
+    def write_theme_snapshot(file_path: str, snapshot: ThemeSnapshot, file_type: ThemeFileType,
+                             extra_sources: list[AssetSource] | None = None,
+                             serialized: tuple[str, ImageBlobWriter | None] | None = None):
+        """写入主题快照, 先写入临时文件再替换, 保存中断时原文件保持完整"""
         logger.debug(f"保存主题至: {basename(file_path)}")
 
-        data_string = json.dumps(theme.to_dict(), ensure_ascii=False)
+        data_string, blobs = serialized if serialized else snapshot.serialize()
+        temp_path = file_path + TEMP_SUFFIX
+        try:
+            with open(temp_path, "wb") as f:
+                ThemeManager.write_theme_data(f, snapshot, file_type, data_string, blobs, extra_sources)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if isfile(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def write_theme_data(f: typing.BinaryIO, snapshot: ThemeSnapshot, file_type: ThemeFileType, data_string: str,
+                         blobs: ImageBlobWriter | None, extra_sources: list[AssetSource] | None):
         if file_type == ThemeFileType.RAW_JSON:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(data_string)
+            f.write(data_string.encode("utf-8"))
             return
 
-        header = json.dumps({"type": file_type.value}).encode("utf-8")
-        with open(file_path, "wb") as f:
-            f.write(ThemeManager.NORMAL_THEME_HEADER)
-            f.write(len(header).to_bytes(8, "little"))
-            f.write(header)
-            if file_type == ThemeFileType.ZIP_COMPRESS:
-                compressed_theme = zlib.compress(data_string.encode("utf-8"), 1)
-                f.write(len(compressed_theme).to_bytes(8, "little"))
-                f.write(compressed_theme)
-            elif file_type == ThemeFileType.ZIP_FILE:
-                zip_io = BytesIO()
-                zip_file = ZipFile(zip_io, "x", ZIP_DEFLATED, compresslevel=1)
-                zip_file.writestr("theme.json", data_string)
-                if extra_sources:
-                    dir_info = ZipInfo("sources/", typing.cast(tuple[int, int, int, int, int, int], time.localtime()))
-                    zip_file.writestr(dir_info, b"")
-                    for source in extra_sources:
-                        if source.internal_source:
-                            continue
-                        full_dir_into_zip(zip_file, source.source_dir, f"sources/{split(source.source_dir)[1]}")
-                zip_file.close()
-                f.write(len(zip_io.getbuffer()).to_bytes(8, "little"))
-                f.write(zip_io.getbuffer())
+        header = json.dumps({"type": file_type.value, "theme": snapshot.header}, ensure_ascii=False).encode("utf-8")
+        f.write(ThemeManager.NORMAL_THEME_HEADER)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        if file_type in (ThemeFileType.ZIP_COMPRESS, ThemeFileType.BLOB_CONTAINER):
+            compressed_theme = zlib.compress(data_string.encode("utf-8"), 1)
+            f.write(len(compressed_theme).to_bytes(8, "little"))
+            f.write(compressed_theme)
+        if file_type == ThemeFileType.BLOB_CONTAINER:  # 图像块索引 + 图像块
+            table = zlib.compress(json.dumps(blobs.table()).encode("utf-8"), 1)
+            f.write(len(table).to_bytes(8, "little"))
+            f.write(table)
+            for chunk in blobs.chunks():
+                f.write(chunk)
+        elif file_type == ThemeFileType.ZIP_FILE:
+            zip_io = BytesIO()
+            zip_file = ZipFile(zip_io, "x", ZIP_DEFLATED, compresslevel=1)
+            zip_file.writestr("theme.json", data_string)
+            if extra_sources:
+                dir_info = ZipInfo("sources/", typing.cast(tuple[int, int, int, int, int, int], time.localtime()))
+                zip_file.writestr(dir_info, b"")
+                for source in extra_sources:
+                    if source.internal_source:
+                        continue
+                    full_dir_into_zip(zip_file, source.source_dir, f"sources/{split(source.source_dir)[1]}")
+            zip_file.close()
+            f.write(len(zip_io.getbuffer()).to_bytes(8, "little"))
+            f.write(zip_io.getbuffer())
 
     @staticmethod
     def save_rendered_theme_file(file_path: str, theme: CursorTheme,
-                                 file_type: ThemeFileType = ThemeFileType.ZIP_COMPRESS):
+                                 file_type: ThemeFileType = ThemeFileType.ZIP_COMPRESS) -> Future:
         new_theme = theme.copy()
         for i, project in enumerate(new_theme.projects):
             new_project = project.copy()
@@ -275,28 +425,35 @@ class ThemeManager:
             new_project.elements.append(frame_element)
             new_project.scale = saved_scale
             new_theme.projects[i] = new_project
-        ThemeManager.save_theme_file(file_path, new_theme, file_type)
+        return ThemeManager.submit_theme_file(file_path, new_theme, file_type)
 
     def add_theme(self, theme: CursorTheme):  # 添加主题
         self.themes.append(theme)
         self.call_callback(ThemeAction.ADD, theme)
 
     def remove_theme(self, theme: CursorTheme):  # 移除主题
-        if theme in self.theme_file_mapping:
-            if isfile(self.theme_file_mapping[theme]):
-                os.remove(self.theme_file_mapping[theme])
-            del self.theme_file_mapping[theme]
-        self.themes.remove(theme)
+        if isinstance(theme, LazyCursorTheme):
+            theme.hydrate()  # 主题文件即将被删除
+            if theme.hydrate_failed:  # 已被移出列表, 无法备份的主题文件不删除
+                return
+        with self.file_lock:
+            if theme in self.theme_file_mapping:
+                if isfile(self.theme_file_mapping[theme]):
+                    os.remove(self.theme_file_mapping[theme])
+                del self.theme_file_mapping[theme]
+            self.saved_digests.pop(theme, None)
+            self.themes.remove(theme)
         self.call_callback(ThemeAction.DELETE, theme)
 
     def renew_theme(self, theme: CursorTheme):  # 刷新主题名称
-        if theme not in self.theme_file_mapping:
-            return
-        raw_path = self.theme_file_mapping.pop(theme)[:]
-        self.theme_file_mapping[theme] = join(self.root_dir,
-                                              f"MineCursor Theme_{theme.id}_{theme.name}.mctheme")
-        if isfile(raw_path):
-            rename(raw_path, self.theme_file_mapping[theme])
+        with self.file_lock:  # 避免与保存线程同时操作主题文件
+            if theme not in self.theme_file_mapping:
+                return
+            raw_path = self.theme_file_mapping.pop(theme)[:]
+            self.theme_file_mapping[theme] = join(self.root_dir,
+                                                  f"MineCursor Theme_{theme.id}_{theme.name}.mctheme")
+            if isfile(raw_path):
+                rename(raw_path, self.theme_file_mapping[theme])
 
     def register_theme_change_callback(self, action: ThemeAction, callback: Callable[[CursorTheme], None]):  # 注册回调
         if action not in self.callbacks:
@@ -309,7 +466,9 @@ class ThemeManager:
                 callback(theme)
 
     def find_project(self, project_id: str):  # 查找项目
-        for theme in self.themes:
+        # 优先查找已加载的主题, 避免加载所有懒加载主题
+        themes = sorted(self.themes, key=lambda t: isinstance(t, LazyCursorTheme) and not t.hydrated)
+        for theme in themes:
             for project in theme.projects:
                 if project.id == project_id:
                     return project
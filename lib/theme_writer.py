@@ -0,0 +1,107 @@
+import json
+from base64 import b64encode
+from concurrent.futures import Future
+from io import BytesIO
+from queue import Queue
+from threading import Thread
+from typing import Any, Callable
+
+from PIL import Image
+
+from lib.datas.image_blob import ImageBlobWriter
+from lib.datas.theme import CursorTheme
+from lib.log import logger
+
+SAVE_QUEUE_SIZE = 16
+
+
+def copy_structure(data: Any) -> Any:
+    """复制 to_dict() 结果中的字典与列表, 使快照不与主题共用可变对象"""
+    if isinstance(data, dict):
+        return {key: copy_structure(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [copy_structure(value) for value in data]
+    return data
+
+
+def png_base64(image: Image.Image) -> str:
+    image_io = BytesIO()
+    image.save(image_io, format="PNG")
+    return b64encode(image_io.getvalue()).decode("utf-8")
+
+
+def inline_images(data: Any) -> Any:
+    """将快照中的图像块引用转换为旧格式的内联PNG, 与 to_dict() 不传入 blobs 时的结果一致"""
+    if isinstance(data, list):
+        return [inline_images(value) for value in data]
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for key, value in data.items():
+        if key == "image_blob":
+            result["image"] = png_base64(value.image)
+        elif key == "mask_blob":
+            result["mask"] = (value.image.size, png_base64(value.image))
+        else:
+            result[key] = inline_images(value)
+    return result
+
+
+class ThemeSnapshot:
+    """
+    主题在某一时刻的数据, 只包含字典/列表与待编码的图像
+    获取快照只需遍历主题结构, 图像编码、JSON序列化与压缩可在其他线程中进行
+    """
+
+    def __init__(self, theme: CursorTheme, use_blobs: bool):
+        self.id = theme.id
+        self.name = theme.name
+        self.header = theme.header_dict()
+        self.header["project_count"] = theme.project_count
+        self.use_blobs = use_blobs
+        self.blobs = ImageBlobWriter(deferred=True)
+        self.data = copy_structure(theme.to_dict(self.blobs))
+
+    def serialize(self) -> tuple[str, ImageBlobWriter | None]:
+        """返回 (结构数据JSON, 图像块), 不使用图像块时图像内联在JSON中"""
+        if self.use_blobs:
+            return json.dumps(self.data, ensure_ascii=False, default=self.blobs.resolve), self.blobs
+        return json.dumps(inline_images(self.data), ensure_ascii=False), None
+
+
+class ThemeSaveWriter:
+    """
+    后台保存线程, 按提交顺序执行保存任务
+    队列已满时提交方等待, 程序退出前需调用 flush 等待所有任务写入完成
+    """
+
+    def __init__(self, max_pending: int = SAVE_QUEUE_SIZE):
+        self.queue: Queue[tuple[Callable[[], None], Future]] = Queue(max_pending)
+        self.thread = Thread(target=self.run, name="ThemeSaveWriter", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            job, future = self.queue.get()
+            try:
+                job()
+            except Exception as e:
+                logger.error(f"保存主题失败: {e.__class__.__name__}: {e}")
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+            finally:
+                self.queue.task_done()
+
+    def submit(self, job: Callable[[], None]) -> Future:
+        """提交保存任务, 返回的 Future 在任务完成或出错时结束 (回调在保存线程中调用)"""
+        future = Future()
+        self.queue.put((job, future))
+        return future
+
+    def flush(self):
+        """等待已提交的保存任务全部完成"""
+        self.queue.join()
+
+
+theme_writer = ThemeSaveWriter()
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import cpu_count, makedirs
+from os.path import join, isdir, abspath
+from time import perf_counter
+from typing import Any
+
+LAUNCH_DIR = os.getcwd()  # 命令行中的相对路径相对于启动时的目录
+os.chdir(os.path.split(os.path.split(os.path.split(os.path.abspath(__file__))[0])[0])[0])
+sys.path.append(os.getcwd())
+from lib.cursor.writer import write_cursor_progress, resize_export_frame
+from lib.data import CursorTheme, CursorProject
+from lib.render import render_project
+from lib.resources import ThemeManager
+
+FORMATS = ("cursor", "png", "apng")
+JIFFY = 1000 / 60  # ANI的显示时间单位, 毫秒
+APNG_MAX_DURATION = 65535  # APNG帧延时以16位整数保存, 毫秒
+
+# 工作进程内已加载的主题
+_worker_themes: dict[str, CursorTheme] = {}
+
+
+def load_theme(file_path: str) -> CursorTheme:
+    if file_path not in _worker_themes:
+        _worker_themes[file_path], _ = ThemeManager.load_theme_file(file_path)
+    return _worker_themes[file_path]
+
+
+def theme_output_dir(output_dir: str, theme: CursorTheme) -> str:
+    return join(output_dir, f"{theme.name}_{theme.id}")
+
+
+def export_project(file_path: str, index: int, output_dir: str, formats: list[str]) -> dict[str, Any]:
+    """(工作进程) 渲染并导出主题中的一个项目, 返回耗时信息"""
+    timer = perf_counter()
+    theme = load_theme(file_path)
+    project: CursorProject = theme.projects[index]
+    load_time = perf_counter() - timer
+    project_dir = theme_output_dir(output_dir, theme)
+    makedirs(project_dir, exist_ok=True)
+
+    timer = perf_counter()
+    frames = render_project(project, for_export=True)
+    render_time = perf_counter() - timer
+
+    timer = perf_counter()
+    base_name = join(project_dir, project.kind.off_name)
+    outputs = []
+    if "cursor" in formats:
+        path = base_name + (".ani" if project.is_ani_cursor else ".cur")
+        list(write_cursor_progress(path, frames, project))
+        outputs.append(path)
+    frames = [resize_export_frame(frame, project) for frame in frames]  # 图片只导出项目渲染缩放对应的尺寸
+    if "png" in formats:
+        makedirs(base_name, exist_ok=True)
+        for i, frame in enumerate(frames):
+            path = join(base_name, f"{i}.png")
+            frame.save(path, format="PNG")
+            outputs.append(path)
+    if "apng" in formats:
+        path = base_name + ".apng"
+        if len(frames) > 1:
+            durations = [min(int(rate * JIFFY), APNG_MAX_DURATION) for rate in project.real_ani_rates]
+            frames[0].save(path, format="PNG", save_all=True, append_images=frames[1:], duration=durations, loop=0)
+        else:
+            frames[0].save(path, format="PNG")
+        outputs.append(path)
+    write_time = perf_counter() - timer
+
+    return {
+        "theme": theme.id,
+        "index": index,
+        "name": project.name,
+        "kind": project.kind.off_name,
+        "frames": len(frames),
+        "load_seconds": round(load_time, 6),
+        "render_seconds": round(render_time, 6),
+        "write_seconds": round(write_time, 6),
+        "outputs": outputs,
+    }
+
+
+def find_theme_files(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if isdir(join(LAUNCH_DIR, path)):
+            files.extend(sorted(join(path, name) for name in os.listdir(join(LAUNCH_DIR, path))
+                                if name.endswith(".mctheme")))
+        else:
+            files.append(path)
+    return [abspath(join(LAUNCH_DIR, file)) for file in files]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量渲染并导出MineCursor主题 (无界面)")
+    parser.add_argument("themes", nargs="+", help="主题文件 (.mctheme) 或包含主题文件的文件夹")
+    parser.add_argument("-o", "--output", required=True, help="导出文件夹, 每个主题导出至其中的 <名称>_<ID> 文件夹")
+    parser.add_argument("-f", "--formats", nargs="+", choices=FORMATS, default=["cursor"],
+                        help="导出格式: cursor (.cur/.ani), png (逐帧PNG), apng (动态PNG)")
+    parser.add_argument("-j", "--workers", type=int, default=0, help="并行的进程数, 0为CPU核心数")
+    parser.add_argument("--timing", default="-", help="耗时信息 (JSON) 的保存路径, - 为输出至标准输出")
+    args = parser.parse_args()
+
+    output_dir = abspath(join(LAUNCH_DIR, args.output))
+    workers = args.workers or cpu_count() or 1
+    total_timer = perf_counter()
+    report: dict[str, Any] = {"workers": workers, "formats": args.formats, "themes": [], "errors": []}
+
+    jobs = []
+    for file_path in find_theme_files(args.themes):
+        try:
+            header = ThemeManager.load_theme_header(file_path)  # 只读取头信息, 项目在工作进程中加载
+            if header is None:
+                theme, _ = ThemeManager.load_theme_file(file_path)
+                header = {"id": theme.id, "name": theme.name, "project_count": len(theme.projects)}
+        except Exception as e:
+            report["errors"].append({"file": file_path, "error": f"{e.__class__.__name__}: {e}"})
+            continue
+        report["themes"].append({"file": file_path, "id": header["id"], "name": header["name"], "projects": []})
+        jobs.extend((file_path, index) for index in range(header["project_count"]))
+
+    themes_by_file = {theme_report["file"]: theme_report for theme_report in report["themes"]}
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {executor.submit(export_project, file_path, index, output_dir, args.formats): (file_path, index)
+                   for file_path, index in jobs}
+        for future in as_completed(futures):
+            file_path, index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                report["errors"].append({"file": file_path, "index": index, "error": f"{e.__class__.__name__}: {e}"})
+                continue
+            themes_by_file[file_path]["projects"].append(result)
+    for theme_report in report["themes"]:
+        theme_report["projects"].sort(key=lambda result: result["index"])
+    report["total_seconds"] = round(perf_counter() - total_timer, 6)
+
+    timing = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.timing == "-":
+        print(timing)
+    else:
+        with open(join(LAUNCH_DIR, args.timing), "w", encoding="utf-8") as f:
+            f.write(timing)
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
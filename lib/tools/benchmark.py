@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+from os.path import join, isfile
+from time import perf_counter
+from typing import Callable, Any
+
+LAUNCH_DIR = os.getcwd()  # 命令行中的相对路径相对于启动时的目录
+os.chdir(os.path.split(os.path.split(os.path.split(os.path.abspath(__file__))[0])[0])[0])
+sys.path.append(os.getcwd())
+from PIL import Image
+
+from lib.cursor.writer import write_cursor_progress
+from lib.data import CursorProject, CursorElement, CursorTheme, AssetSourceInfo, AssetType, Position, Scale2D
+from lib.datas.source import texture_table
+from lib.render import render_project_frame, render_project
+from lib.render_cache import transform_cache
+from lib.render_profile import render_profiler
+from lib.resources import ThemeManager, ThemeFileType
+
+THEMES_DIR = "assets/default_themes"
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.2  # 中位数比基线慢20%以上视为性能退化
+MIN_REGRESSION_SECONDS = 0.001  # 耗时差距小于1ms的测试受计时误差影响大, 不视为退化
+
+
+def random_image(rng: random.Random, size: tuple[int, int], mode: str = "RGBA") -> Image.Image:
+    return Image.frombytes(mode, size, rng.randbytes(size[0] * size[1] * len(mode)))
+
+
+def image_element(rng: random.Random, name: str, frame_count: int, size: tuple[int, int]) -> CursorElement:
+    frames = [random_image(rng, size) for _ in range(frame_count)]
+    element = CursorElement(name, frames, [AssetSourceInfo(AssetType.IMAGE, size=frame.size, image=frame)
+                                           for frame in frames])
+    element.animation_key_data.frame_length = frame_count
+    element.update_ani_data_by_key_data()
+    return element
+
+
+def make_stress_projects() -> dict[str, CursorProject]:
+    """生成压力测试用的项目, 同一版本中的内容固定"""
+    rng = random.Random(404)
+    projects = {}
+
+    project = CursorProject("many_elements", (32, 32))
+    for i in range(96):
+        element = image_element(rng, f"e{i}", 1, (16, 16))
+        element.position = Position(i % 24 - 4, i // 4 - 4)
+        element.rotation = i * 7 % 360
+        element.scale = Scale2D(1.0 + i % 3 * 0.5, 1.0)
+        if i % 4 == 0:
+            element.mask = random_image(rng, (16, 16), "L")
+        project.add_element(element)
+    projects[project.name] = project
+
+    project = CursorProject("long_animation", (32, 32))
+    project.is_ani_cursor = True
+    project.frame_count = 240
+    project.render_scale = 4
+    for i in range(8):
+        element = image_element(rng, f"e{i}", 8, (16, 16))
+        element.position = Position(i * 2, i * 2)
+        element.animation_start_offset = i * 3
+        project.add_element(element)
+    projects[project.name] = project
+
+    project = CursorProject("nested_sub_projects", (32, 32))
+    project.is_ani_cursor = True
+    project.frame_count = 16
+    inner = [image_element(rng, f"leaf{i}", 4, (8, 8)) for i in range(4)]
+    for depth in range(3):
+        wrapper = CursorElement(f"sub{depth}", [])
+        wrapper.create_sub_project(f"sub{depth}", (16, 16), inner)
+        wrapper.sub_project.frame_count = 16
+        wrapper.rotation = 30
+        inner = [wrapper, image_element(rng, f"side{depth}", 2, (8, 8))]
+    for element in inner:
+        project.add_element(element)
+    projects[project.name] = project
+
+    project = CursorProject("large_masks", (256, 256))
+    project.scale = 1.0
+    for i in range(8):
+        element = image_element(rng, f"e{i}", 1, (256, 256))
+        element.mask = random_image(rng, (256, 256), "L")
+        element.mask_color = (i * 30, 255 - i * 30, 128)
+        project.add_element(element)
+    projects[project.name] = project
+    return projects
+
+
+def load_default_themes() -> dict[str, CursorTheme]:
+    themes = {}
+    for file_name in sorted(os.listdir(THEMES_DIR)):
+        try:
+            theme, _ = ThemeManager.load_theme_file(join(THEMES_DIR, file_name))
+        except Exception as e:
+            print(f"跳过 [{file_name}]: {e.__class__.__name__}: {e}", file=sys.stderr)
+            continue
+        themes[join(THEMES_DIR, file_name)] = theme
+    return themes
+
+
+def mark_all_changed(projects: list[CursorProject]):
+    """使项目及其中所有子项目缓存的帧失效"""
+    for project in projects:
+        project.mark_changed()
+        mark_all_changed([element.sub_project for element in project.elements if element.sub_project])
+
+
+def clear_caches(projects: list[CursorProject]):
+    """每次运行前清空缓存, 测得的是冷启动耗时"""
+    transform_cache.clear()
+    texture_table.clear()
+    mark_all_changed(projects)
+
+
+def measure(func: Callable[[], Any], repeat: int, projects: list[CursorProject]) -> dict[str, Any]:
+    runs = []
+    for _ in range(repeat):
+        clear_caches(projects)
+        timer = perf_counter()
+        func()
+        runs.append(perf_counter() - timer)
+    return {
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.fmean(runs),
+        "runs": runs,
+    }
+
+
+def collect_benchmarks(temp_dir: str) -> tuple[dict[str, Callable[[], Any]], list[CursorProject]]:
+    """返回各项测试与测试中渲染的所有项目"""
+    themes = load_default_themes()
+    projects = make_stress_projects()
+    theme_projects = [project for theme in themes.values() for project in theme.projects]
+    benchmarks: dict[str, Callable[[], Any]] = {}
+
+    def load_themes():
+        for file_path in themes:
+            ThemeManager.load_theme_file(file_path)
+
+    def save_themes(file_type: ThemeFileType):
+        for i, theme in enumerate(themes.values()):
+            ThemeManager.save_theme_file(join(temp_dir, f"{i}.mctheme"), theme, file_type)
+
+    def render_frames(render_projects: list[CursorProject]):
+        for project in render_projects:
+            render_project_frame(project, 0, True)
+
+    def write_cursors(render_projects: list[CursorProject], frames: list[list[Image.Image]]):
+        for i, (project, project_frames) in enumerate(zip(render_projects, frames)):
+            path = join(temp_dir, f"{i}." + ("ani" if project.is_ani_cursor else "cur"))
+            list(write_cursor_progress(path, project_frames, project))
+
+    benchmarks["theme/load_theme_file"] = load_themes
+    benchmarks["theme/save_theme_file/blob_container"] = lambda: save_themes(ThemeFileType.BLOB_CONTAINER)
+    benchmarks["theme/save_theme_file/zip_compress"] = lambda: save_themes(ThemeFileType.ZIP_COMPRESS)
+    benchmarks["default_themes/render_project_frame"] = lambda: render_frames(theme_projects)
+    benchmarks["default_themes/render_project"] = lambda: [render_project(p, True) for p in theme_projects]
+    theme_frames = [render_project(project, True) for project in theme_projects]
+    benchmarks["default_themes/write_cursor"] = lambda: write_cursors(theme_projects, theme_frames)
+
+    for name, project in projects.items():
+        benchmarks[f"stress/{name}/render_project_frame"] = lambda p=project: render_frames([p])
+        benchmarks[f"stress/{name}/render_project"] = lambda p=project: render_project(p, True)
+        frames = render_project(project, True)
+        benchmarks[f"stress/{name}/write_cursor"] = lambda p=project, f=frames: write_cursors([p], [f])
+    return benchmarks, theme_projects + list(projects.values())
+
+
+def compare(results: dict[str, dict[str, Any]], baseline: dict[str, dict[str, Any]],
+            tolerance: float) -> dict[str, dict[str, Any]]:
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]["median"]
+        ratio = result["median"] / base if base else 1.0
+        regression = ratio > 1 + tolerance and result["median"] - base > MIN_REGRESSION_SECONDS
+        comparison[name] = {"ratio": ratio, "regression": regression}
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="渲染、加载、保存与导出的性能基准测试")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每项测试的运行次数")
+    parser.add_argument("-k", "--filter", default="", help="只运行名称包含该文本的测试")
+    parser.add_argument("-o", "--output", default="-", help="结果 (JSON) 的保存路径, - 为输出至标准输出")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="用于对比的基线结果文件")
+    parser.add_argument("--update-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="允许的变慢比例")
+    parser.add_argument("--profile", default="", help="记录渲染跨度并将直方图、折叠栈与时间线保存至该文件夹")
+    args = parser.parse_args()
+    render_profiler.enabled = bool(args.profile)
+
+    baseline_path = join(LAUNCH_DIR, args.baseline)
+    with tempfile.TemporaryDirectory(prefix="MineCursorBenchmark") as temp_dir:
+        results = {}
+        benchmarks, projects = collect_benchmarks(temp_dir)
+        render_profiler.reset()  # 不记录准备测试数据时的渲染
+        for name, func in benchmarks.items():
+            if args.filter not in name:
+                continue
+            results[name] = measure(func, args.repeat, projects)
+            print(f"{name}: {results[name]['median'] * 1000:.3f} ms", file=sys.stderr)
+
+    report: dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "benchmarks": results,
+    }
+    regressions = []
+    if isfile(baseline_path) and not args.update_baseline:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["benchmarks"]
+        report["comparison"] = compare(results, baseline, args.tolerance)
+        regressions = [name for name, item in report["comparison"].items() if item["regression"]]
+        for name in regressions:
+            print(f"性能退化 [{name}]: {report['comparison'][name]['ratio']:.2f}x", file=sys.stderr)
+
+    if args.profile:
+        profile_dir = join(LAUNCH_DIR, args.profile)
+        os.makedirs(profile_dir, exist_ok=True)
+        render_profiler.dump(profile_dir)
+
+    report_string = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(report_string)
+    else:
+        with open(join(LAUNCH_DIR, args.output), "w", encoding="utf-8") as f:
+            f.write(report_string)
+    if args.update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            f.write(report_string)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
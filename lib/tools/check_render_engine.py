@@ -0,0 +1,62 @@
+import os
+import sys
+from os.path import join
+
+os.chdir(os.path.split(os.path.split(os.path.split(__file__)[0])[0])[0])
+sys.path.append(os.getcwd())
+from lib.config import config
+from lib.render import render_project_frame
+from lib.render_cache import transform_cache
+from lib.render_np import np
+from lib.resources import ThemeManager
+
+THEMES_DIR = "assets/default_themes"
+
+
+def render_theme_frames(file_path: str, use_numpy: bool) -> list[bytes]:
+    """以指定的合成引擎渲染主题的所有帧 (编辑器预览+导出)"""
+    config.numpy_compositor = use_numpy
+    transform_cache.clear()  # 避免两个引擎共用缓存图层
+    theme, _ = ThemeManager.load_theme_file(file_path)
+    frames = []
+    for project in theme.projects:
+        frame_count = project.frame_count if project.is_ani_cursor else 1
+        for for_export in (False, True):
+            for frame in range(frame_count):
+                frames.append(render_project_frame(project, frame, for_export).tobytes())
+    return frames
+
+
+def main():
+    print()
+    print("合成引擎一致性检查工具 - 对比PIL与NumPy合成引擎的渲染结果")
+    print()
+    if np is None:
+        print("未安装NumPy, 无法检查")
+        sys.exit(1)
+
+    failed = []
+    for file_name in sorted(os.listdir(THEMES_DIR)):
+        file_path = join(THEMES_DIR, file_name)
+        try:
+            pil_frames = render_theme_frames(file_path, False)
+            numpy_frames = render_theme_frames(file_path, True)
+        except Exception as e:
+            print(f"跳过 [{file_name}]: {e.__class__.__name__}: {e}")
+            continue
+        diff_count = sum(a != b for a, b in zip(pil_frames, numpy_frames))
+        if diff_count or len(pil_frames) != len(numpy_frames):
+            failed.append(file_name)
+            print(f"不一致 [{file_name}]: {diff_count}/{len(pil_frames)} 帧")
+        else:
+            print(f"一致 [{file_name}]: {len(pil_frames)} 帧")
+
+    print()
+    if failed:
+        print(f"{len(failed)} 个主题的渲染结果不一致")
+        sys.exit(1)
+    print("所有主题的渲染结果均一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,7 +30,7 @@ def main():
 
     # 输出备选主题
     for i, theme in enumerate(theme_manager.themes):
-        print(f"{i} -> 主题 [{theme.name}] ({len(theme.projects)}-curs) ({theme.id})")
+        print(f"{i} -> 主题 [{theme.name}] ({theme.project_count}-curs) ({theme.id})")
     print()
 
     # 输入主题信息
@@ -1,5 +1,6 @@
 import ctypes
 import faulthandler
+import multiprocessing
 import os
 import sys
 from datetime import datetime
@@ -87,4 +88,5 @@ class MineCursorLauncher:
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包环境下的渲染进程入口
     MineCursorLauncher()
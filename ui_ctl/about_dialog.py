@@ -4,7 +4,7 @@ import wx
 from PIL import Image
 
 from lib.dialog_fix import register_close
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImg2WxBmp
 from lib.info import *
 from widget.center_text import CenteredText
 from widget.font import ft
@@ -22,7 +22,7 @@ class AboutDialog(wx.Dialog):
         if parent:
             self.SetFont(parent.GetFont())
 
-        self.icon = wx.StaticBitmap(self, bitmap=PilImg2WxImg(Image.open(r"assets\icon.png").resize((128, 128))))
+        self.icon = wx.StaticBitmap(self, bitmap=PilImg2WxBmp(Image.open(r"assets\icon.png").resize((128, 128))))
         self.title = CenteredText(self, label=f"       MineCursor {VERSION}       ", x_center=True, y_center=False)
         self.open_project_github = wx.Button(self, label="项目Github主页")
         self.info = wx.TextCtrl(self, style=wx.TE_MULTILINE | wx.TE_READONLY)
@@ -30,6 +30,7 @@ class CursorEditor(CursorEditorUI):
         self.b_canvas_size = self.project.raw_canvas_size
         self.b_output_size = self.project.canvas_size
         self.b_scale = self.canvas.scale
+        self.elements_lc.element_image_cbk = self.canvas.element_image
 
         self.canvas.Bind(wx.EVT_MOTION, self.on_mouse_move)
         self.canvas.Bind(wx.EVT_LEAVE_WINDOW, self.on_mouse_leave)
@@ -76,7 +77,7 @@ class CursorEditor(CursorEditorUI):
         if event.GetEventObject() is not self.elements_lc:
             self.elements_lc.set_element(event.element)
         if event.element:
-            self.b_rect_size = event.element.final_rect[2:]
+            self.b_rect_size = self.canvas.element_rect(event.element)[2:]
         else:
             self.b_rect_size = None
 
@@ -87,6 +88,7 @@ class CursorEditor(CursorEditorUI):
 
         event.Skip()
         logger.debug("项目数据已更新")
+        self.project.mark_changed()
         self.elements_lc.project_updated()
         self.canvas.project_updated()
         if self.canvas.active_element is None:
@@ -4,16 +4,17 @@ from typing import cast as type_cast
 
 import wx
 from PIL import Image
-from PIL.Image import Resampling
 
 from lib.data import CursorProject, CursorElement, Position
-from lib.image_pil2wx import PilImg2WxImg
 from lib.log import logger
 from lib.perf import FPSMonitor
-from lib.render import render_project_frame
+from lib.render_incremental import IncrementalFrame
 from ui.cursor_editor import ElementCanvasUI
 from ui_ctl.cursor_editor_widgets.events import ElementSelectedEvent, ScaleUpdatedEvent, ProjectUpdatedEvent, \
     AnimationModeChangeEvent, AnimationMode, FrameCounterChangeEvent
+from ui_ctl.cursor_editor_widgets.frame_producer import FrameProducer, RenderedFrame, ElementRect, \
+    render_frame_snapshot, snapshot_frame
+from ui_ctl.cursor_editor_widgets.frame_pyramid import ScaledFramePyramid
 
 
 class AnimationManager:
@@ -108,7 +109,12 @@ class ElementCanvas(ElementCanvasUI):
         self.y_offset: float = 0.5
         self.frame_index = -1
         self.frames: dict[int, Image.Image] = {}
-        self.scaled_frame_cache: dict[int, wx.GraphicsBitmap] = {}  # 在不同缩放值下的DC内容缓存
+        self.frame_snapshots: dict[int, RenderedFrame] = {}  # 各帧渲染时的元素外框与图像
+        self.shown_frame: RenderedFrame | None = None  # 正在显示的帧
+        self.scaled_frame_cache = ScaledFramePyramid(EC_SCALE_LEVEL)  # 当前及相邻缩放值下的DC内容缓存
+        self.last_bitmap: wx.GraphicsBitmap | None = None  # 上一次绘制的帧, 当前帧未渲染完成时继续显示
+        self.producer = FrameProducer(project, lambda *args: wx.CallAfter(self.on_frame_produced, *args))
+        self.drag_frames: dict[int, IncrementalFrame] = {}  # 拖动元素时各帧的增量合成器
         self.last_point = None
         self.last_index = 0
         self.drag_offset: tuple[int, int] | None = None
@@ -140,22 +146,23 @@ class ElementCanvas(ElementCanvasUI):
             if self.animation_manager.is_alive():
                 self.animation_manager.stop()
             self.frame_index = event.frame_index
+            self.producer.request(self.frame_index)
             self.Refresh()
 
     def on_destroy(self, event: wx.WindowDestroyEvent):
         if self.animation_manager.is_alive():
             self.animation_manager.stop()
-        # 自行销毁缓存Bitmap, 确保在GraphicsContext销毁时, 不会触发内存泄漏
-        for bitmap in self.scaled_frame_cache.values():
-            bitmap.Destroy()
-        self.scaled_frame_cache.clear()
+        self.producer.close()
+        self.scaled_frame_cache.close()
         event.Skip()
 
     def set_element(self, element: CursorElement | None):
         self.active_element = element
+        self.drag_frames.clear()
         self.Refresh()
 
     def project_updated(self):
+        self.drag_frames.clear()
         self.clear_frame_cache()
         if self.active_element not in self.project.elements:
             self.active_element = None
@@ -170,14 +177,43 @@ class ElementCanvas(ElementCanvasUI):
 
     def clear_frame_cache(self):
         self.frames.clear()
+        self.frame_snapshots.clear()
         self.scaled_frame_cache.clear()
+        self.producer.invalidate()
+
+    def on_frame_produced(self, generation: int, frame_index: int, rendered: RenderedFrame | None):
+        """(主线程) 后台预渲染的帧完成, 渲染失败时 rendered 为None, 绘制时在主线程重新渲染"""
+        if generation != self.producer.generation:  # 项目已被修改或画布已销毁
+            return
+        if rendered is not None:
+            self.frames[frame_index] = rendered.image
+            self.frame_snapshots[frame_index] = rendered
+        if frame_index == self.frame_index:
+            self.Refresh()
+
+    def request_frame(self, frame_index: int) -> bool:
+        """请求后台从该帧开始预渲染, 返回该帧是否会由后台渲染 (渲染失败或未被安排时需在主线程渲染)"""
+        self.producer.request(frame_index)
+        return self.producer.is_pending(frame_index)
+
+    def element_rect(self, element: CursorElement) -> ElementRect:
+        """元素在正在显示的帧中的外框"""
+        if self.shown_frame is None:
+            return element.final_rect
+        return self.shown_frame.rects.get(element, element.final_rect)
+
+    def element_image(self, element: CursorElement) -> Image.Image:
+        """元素在正在显示的帧中变换后的图像"""
+        if self.shown_frame is None:
+            return element.final_image
+        return self.shown_frame.element_images.get(element, element.final_image)
 
     # 鼠标响应函数
 
     def get_point_elements(self, position: tuple[int, int]):
         elements = []
         for element in self.project.elements:
-            if wx.Rect(*element.final_rect).Contains(position):
+            if wx.Rect(*self.element_rect(element)).Contains(position):
                 elements.append(element)
         return elements
 
@@ -212,6 +248,8 @@ class ElementCanvas(ElementCanvasUI):
             if self.drag_offset:
                 logger.debug("拖动结束")
                 self.drag_offset: tuple[int, int] | None = None
+                self.drag_frames.clear()
+                self.producer.set_paused(False)
                 wx.PostEvent(self.GetParent(), ProjectUpdatedEvent())
                 self.post_element_selected(self.active_element)
                 self.ReleaseMouse()
@@ -255,6 +293,7 @@ class ElementCanvas(ElementCanvasUI):
                     return
                 ele_pos = self.active_element.position
                 self.drag_offset: tuple[int, int] | None = (pos[0] - ele_pos.x, pos[1] - ele_pos.y)
+                self.producer.set_paused(True)  # 拖动时每次移动都会使帧缓存失效, 由主线程增量合成
                 logger.debug(f"元素拖动开始 -> {self.active_element}")
                 self.CaptureMouse()
             else:
@@ -298,7 +337,6 @@ class ElementCanvas(ElementCanvasUI):
             self.scale = EC_SCALE_LEVEL[self.scale_index]
         self.Refresh()
         logger.debug(f"缩放比例更新 -> {self.scale}")
-        self.scaled_frame_cache.clear()
         wx.PostEvent(self, ScaleUpdatedEvent(self.scale))
 
     # 绘制类函数
@@ -309,6 +347,7 @@ class ElementCanvas(ElementCanvasUI):
     def frame_call(self):
         self.update_frame()
         self.frame_add()
+        self.producer.request(self.frame_index)
         self.fps_monitor.count()
 
     def update_frame(self):
@@ -340,19 +379,22 @@ class ElementCanvas(ElementCanvasUI):
         gc = wx.GraphicsContext.Create(dc)
 
         # 获取缩放后的帧
-        if self.frame_index not in self.frames or self.frame_index not in self.scaled_frame_cache:
-            if self.frame_index not in self.frames:
-                self.render_frame()
-            current_frame = self.frames[self.frame_index]
-            current_frame = current_frame.resize(
-                (int(current_frame.width * self.scale), int(current_frame.height * self.scale)),
-                resample=Resampling.BOX
-            )
-            image = PilImg2WxImg(current_frame)
-            bitmap = gc.CreateBitmap(image.ConvertToBitmap())
-            self.scaled_frame_cache[self.frame_index] = bitmap
+        bitmap = self.scaled_frame_cache.get(self.scale_index, self.frame_index)
+        if bitmap is None and self.frame_index not in self.frames and self.project.is_ani_cursor \
+                and not self.drag_offset and self.last_bitmap is not None and self.request_frame(self.frame_index):
+            bitmap = self.last_bitmap  # 等待后台渲染, 先继续显示上一帧
         else:
-            bitmap = self.scaled_frame_cache[self.frame_index]
+            if bitmap is None:
+                if self.frame_index not in self.frames:
+                    self.render_frame()
+                drag_frame = self.drag_frames.get(self.frame_index) if self.drag_offset else None
+                bitmap = self.scaled_frame_cache.create(self.scale_index, self.frame_index,
+                                                        self.frames[self.frame_index],
+                                                        drag_frame.view(self.scale) if drag_frame else None)
+            self.shown_frame = self.frame_snapshots.get(self.frame_index)
+            self.last_bitmap = bitmap
+        if not self.drag_offset:  # 拖动时每次移动都会清空缓存, 不预先缩放
+            self.scaled_frame_cache.prefetch(self.scale_index, self.frames)
 
         # 计算画布绘制坐标 + 绘制 + 绘制画布边框
         width, height = self.get_canvas_size()
@@ -380,7 +422,7 @@ class ElementCanvas(ElementCanvasUI):
 
         # 绘制元素外框
         if self.active_element:
-            raw_rect = self.active_element.final_rect
+            raw_rect = self.element_rect(self.active_element)
             corner1 = self.translate_canvas_position(raw_rect[0], raw_rect[1])
             corner2 = self.translate_canvas_position(raw_rect[0] + raw_rect[2], raw_rect[1] + raw_rect[3])
             gc.DrawLines([
@@ -392,12 +434,18 @@ class ElementCanvas(ElementCanvasUI):
             ])
 
     def render_frame(self):
-        if self.frame_index == -1:  # 无动画
-            frame = render_project_frame(self.project, 0)
-            self.frames[-1] = frame
-        else:
-            frame = render_project_frame(self.project, self.frame_index)
-            self.frames[self.frame_index] = frame
+        """在主线程中立即渲染当前帧 (无动画、拖动中或还没有可显示的帧时)"""
+        with self.producer.render_lock:
+            if self.drag_offset and self.active_element:  # 拖动中, 仅增量合成元素的新旧区域
+                frame = self.drag_frames.get(self.frame_index)
+                if frame is None:
+                    frame = IncrementalFrame(self.project, max(self.frame_index, 0), self.active_element)
+                    self.drag_frames[self.frame_index] = frame
+                rendered = snapshot_frame(self.project, frame.render())
+            else:  # 无动画时 frame_index 为-1, 渲染第0帧
+                rendered = render_frame_snapshot(self.project, self.frame_index)
+        self.frames[self.frame_index] = rendered.image
+        self.frame_snapshots[self.frame_index] = rendered
 
     # 工具类函数
 
@@ -1,12 +1,12 @@
-from typing import cast as type_cast
+from typing import Callable, cast as type_cast
 
 import wx
 from PIL import Image
 
 from lib.clipboard import PUBLIC_ELEMENT_CLIPBOARD
-from lib.cursor.writer import write_cur, write_ani
+from lib.cursor.writer import write_cursor_progress
 from lib.data import CursorProject, CursorElement
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImg2WxBmp
 from lib.render import render_project_gen
 from ui.cursor_editor import ElementListCtrlUI
 from ui.select import select_all
@@ -41,6 +41,8 @@ class ElementListCtrl(ElementListCtrlUI):
         self.line_mapping = {}
         self.elements_has_deleted: list[list[tuple[int, CursorElement]]] = []
         self.set_processing = False
+        # 元素在画布正在显示的帧中变换后的图像, 由编辑器指向画布 (后台预渲染会覆盖元素的 final_image)
+        self.element_image_cbk: Callable[[CursorElement], Image.Image] = lambda element: element.final_image
         self.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_select, self)
         self.Bind(wx.EVT_LIST_ITEM_RIGHT_CLICK, self.on_item_menu, self)
         self.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_item_active, self)
@@ -142,6 +144,7 @@ class ElementListCtrl(ElementListCtrlUI):
         dialog = ProjectSizeDialog(self, sub_project.raw_canvas_size)
         if dialog.ShowModal() == wx.ID_OK:
             sub_project.raw_canvas_size = dialog.get_size()
+            sub_project.mark_changed()  # 父项目只标记自身, 子项目的修改需单独标记
             self.send_project_updated()
 
     def create_sub_project(self, elements: list[CursorElement]):
@@ -212,7 +215,7 @@ class ElementListCtrl(ElementListCtrlUI):
 
     def on_edit_mask(self, index: int):
         element = self.get_element_by_index(index)
-        background = element.final_image
+        background = self.element_image_cbk(element)
         if element.mask:
             if element.allow_mask_scale:
                 background = background.resize(element.mask.size, element.scale_resample)
@@ -247,25 +250,17 @@ class ElementListCtrl(ElementListCtrlUI):
 
         render_text = get_text("渲染中")
         progress_dialog = wx.ProgressDialog("导出进度", render_text.format(0))
-        frames = []
         generator = render_project_gen(project, for_export=True)
         progress_dialog.SetRange(project.frame_count)
-        for i, frame in enumerate(generator):
-            progress_dialog.Update(i, render_text.format(i))
-            frames.append(frame)
 
         if not project.is_ani_cursor:
             progress_dialog.SetRange(1)
             progress_dialog.Update(0, "写入cur文件...")
-            write_cur(frames[0], project.center_pos, path)
+            list(write_cursor_progress(path, generator, project))
             progress_dialog.Update(1)
         else:
-            gen = write_ani(path, frames, project)
-            while True:
-                try:
-                    msg, index = next(gen)
-                except StopIteration:
-                    break
+            gen = write_cursor_progress(path, generator, project)  # 每渲染一帧即写入文件
+            for msg, index in gen:
                 if index != -1:
                     new_msg = f"{msg} ({index}/{project.frame_count})..."
                 else:
@@ -326,7 +321,7 @@ class ElementListCtrl(ElementListCtrlUI):
         self.send_project_updated()
 
     def add_element(self, element: CursorElement):
-        index = self.image_list.Add(PilImg2WxImg(element.frames[0].resize((16, 16))).ConvertToBitmap())
+        index = self.image_list.Add(PilImg2WxBmp(element.frames[0].resize((16, 16))))
         line = self.GetItemCount()
         self.InsertItem(line, index)
         self.SetItem(line, 1, element.name)
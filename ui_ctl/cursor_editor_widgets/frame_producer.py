@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from threading import Thread, Condition, Lock
+from typing import Callable
+
+from PIL import Image
+
+from lib.config import config
+from lib.data import CursorProject, CursorElement
+from lib.log import logger
+from lib.render import render_project_frame
+
+ElementRect = tuple[int, int, int, int]
+
+
+@dataclass
+class RenderedFrame:
+    image: Image.Image
+    rects: dict[CursorElement, ElementRect]  # 渲染该帧时各元素的外框, 用于点击检测、绘制选中框与尺寸显示
+    element_images: dict[CursorElement, Image.Image]  # 渲染该帧时各元素变换后的图像, 用作遮罩编辑器的背景
+
+
+def snapshot_frame(project: CursorProject, image: Image.Image) -> RenderedFrame:
+    """记录刚渲染完的帧中各元素的外框与图像 (需持有 render_lock, 否则可能被另一帧的渲染覆盖)"""
+    return RenderedFrame(image, {element: element.final_rect for element in project.elements},
+                         {element: element.final_image for element in project.elements})
+
+
+def render_frame_snapshot(project: CursorProject, frame_index: int) -> RenderedFrame:
+    return snapshot_frame(project, render_project_frame(project, max(frame_index, 0)))
+
+
+class FrameProducer:
+    """
+    编辑器预览的后台帧生产者
+    后台线程按播放顺序渲染当前帧之后的若干帧, 通过 on_frame(代数, 帧序号, 渲染结果) 交给画布, 绘制时无需等待渲染
+    项目被修改后调用 invalidate(), 代数递增, 修改前提交或渲染中途被修改的帧都会被丢弃
+    渲染失败的帧不再重试, 以 on_frame(代数, 帧序号, None) 通知画布, 由主线程同步渲染并报告错误
+    同一项目的渲染 (包括主线程中的同步渲染) 需持有 render_lock, 避免元素外框与图像被另一帧的渲染覆盖
+    """
+
+    def __init__(self, project: CursorProject, on_frame: Callable[[int, int, RenderedFrame | None], None]):
+        self.project = project
+        self.on_frame = on_frame
+        self.render_lock = Lock()
+        self.condition = Condition()
+        self.generation = 0
+        self.target = 0  # 当前播放的帧
+        self.produced: set[int] = set()  # 当前代数中已渲染或正在渲染的帧
+        self.failed: set[int] = set()  # 当前代数中渲染失败的帧, 交给主线程渲染
+        self.paused = False
+        self.closed = False
+        self.thread = Thread(target=self.run, name="FrameProducer", daemon=True)
+        self.thread.start()
+
+    def request(self, frame_index: int):
+        """播放位置改变, 从该帧开始向后预渲染"""
+        with self.condition:
+            self.target = max(frame_index, 0)
+            self.condition.notify()
+
+    def invalidate(self):
+        with self.condition:
+            self.generation += 1
+            self.produced.clear()
+            self.failed.clear()
+            self.condition.notify()
+
+    def set_paused(self, paused: bool):
+        with self.condition:
+            self.paused = paused
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.generation += 1
+            self.condition.notify()
+
+    def scheduled_frames(self) -> list[int]:
+        """从当前播放的帧开始需要预渲染的帧, 至少包含当前帧"""
+        project = self.project
+        if self.closed or self.paused or not project.is_ani_cursor or project.frame_count <= 0:
+            return []
+        count = min(max(config.prerender_frames, 1), project.frame_count)
+        return [(self.target + offset) % project.frame_count for offset in range(count)]
+
+    def is_pending(self, frame_index: int) -> bool:
+        """该帧是否正在渲染或即将由后台渲染, 否则需要主线程同步渲染"""
+        with self.condition:
+            if frame_index in self.failed:
+                return False
+            return frame_index in self.produced or frame_index in self.scheduled_frames()
+
+    def next_job(self) -> int | None:
+        for frame_index in self.scheduled_frames():
+            if frame_index not in self.produced and frame_index not in self.failed:
+                return frame_index
+        return None
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (frame_index := self.next_job()) is None:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                generation = self.generation
+                self.produced.add(frame_index)
+            try:
+                with self.render_lock:
+                    rendered = render_frame_snapshot(self.project, frame_index)
+            except Exception as e:  # 渲染途中项目被修改, 或该帧本身无法渲染 (交给主线程渲染时报告)
+                logger.debug(f"后台预渲染第{frame_index}帧失败: {e.__class__.__name__}: {e}")
+                with self.condition:
+                    if generation != self.generation:
+                        continue
+                    self.produced.discard(frame_index)
+                    self.failed.add(frame_index)
+                rendered = None
+            if generation == self.generation:
+                self.on_frame(generation, frame_index, rendered)
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import wx
+from PIL import Image
+from PIL.Image import Resampling
+
+from lib.config import config
+from lib.image_pil2wx import PilImg2WxBmp
+
+PyramidKey = tuple[int, int]  # (缩放级别序号, 帧序号)
+
+
+def scale_frame(frame: Image.Image, scale: float) -> Image.Image:
+    return frame.resize((int(frame.width * scale), int(frame.height * scale)), resample=Resampling.BOX)
+
+
+class ScaledFramePyramid:
+    """
+    画布帧在各缩放级别下的位图缓存
+    后台线程为当前缩放级别及其相邻级别预先缩放所有已渲染的帧, 位图在主线程中创建
+    总字节数超出上限时, 优先淘汰离当前缩放级别最远的位图
+    """
+
+    def __init__(self, scale_levels: list[float], neighbours: int = 1):
+        self.scale_levels = scale_levels
+        self.neighbours = neighbours
+        self.level = 0  # 当前显示的缩放级别
+        self.bitmaps: dict[PyramidKey, tuple[wx.GraphicsBitmap, int]] = {}  # 键 -> (位图, 字节数)
+        self.total_bytes = 0
+        self.pending: set[PyramidKey] = set()
+        self.generation = 0  # 清空缓存时递增, 丢弃清空前提交的后台结果
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="FramePyramid")
+
+    @property
+    def max_bytes(self) -> int:
+        return int(config.canvas_cache_size * 1024 * 1024)
+
+    def __len__(self):
+        return len(self.bitmaps)
+
+    def get(self, level: int, frame_index: int) -> wx.GraphicsBitmap | None:
+        entry = self.bitmaps.get((level, frame_index))
+        return entry[0] if entry else None
+
+    def create(self, level: int, frame_index: int, frame: Image.Image,
+               scaled: Image.Image | None = None) -> wx.GraphicsBitmap:
+        """
+        在主线程中立即缩放并创建位图 (当前显示的帧尚未缓存时)
+        scaled 为已按该级别缩放的帧 (拖动元素时由增量合成器只修补脏区域), 提供时不再缩放整帧
+        """
+        self.level = level
+        self.pending.discard((level, frame_index))
+        if scaled is None:
+            scaled = scale_frame(frame, self.scale_levels[level])
+        return self.put((level, frame_index), scaled)
+
+    def put(self, key: PyramidKey, scaled: Image.Image) -> wx.GraphicsBitmap:
+        renderer = wx.GraphicsRenderer.GetDefaultRenderer()
+        bitmap = renderer.CreateBitmap(PilImg2WxBmp(scaled))
+        self.remove(key)
+        nbytes = scaled.width * scaled.height * 4
+        self.bitmaps[key] = (bitmap, nbytes)
+        self.total_bytes += nbytes
+        self.evict(key)
+        return bitmap
+
+    def remove(self, key: PyramidKey):
+        entry = self.bitmaps.pop(key, None)
+        if entry:
+            self.total_bytes -= entry[1]
+
+    def evict(self, keep: PyramidKey):
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self.bitmaps, key=lambda k: abs(k[0] - self.level), reverse=True):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key != keep:
+                self.remove(key)
+
+    def wanted_levels(self, level: int) -> list[int]:
+        """当前级别优先, 然后由近及远的相邻级别"""
+        levels = [level]
+        for distance in range(1, self.neighbours + 1):
+            levels.extend(lv for lv in (level + distance, level - distance) if 0 <= lv < len(self.scale_levels))
+        return levels
+
+    def prefetch(self, level: int, frames: dict[int, Image.Image]):
+        """提交当前缩放级别与相邻级别中缺少的位图, 预计超出缓存上限的部分不提交"""
+        self.level = level
+        budget = self.max_bytes
+        for lv in self.wanted_levels(level):
+            scale = self.scale_levels[lv]
+            for frame_index, frame in list(frames.items()):
+                budget -= int(frame.width * scale) * int(frame.height * scale) * 4
+                if budget < 0:
+                    return
+                key = (lv, frame_index)
+                if key in self.bitmaps or key in self.pending:
+                    continue
+                self.pending.add(key)
+                self.executor.submit(self.scale_job, self.generation, key, frame)
+
+    def scale_job(self, generation: int, key: PyramidKey, frame: Image.Image):
+        if generation != self.generation:
+            return
+        if abs(key[0] - self.level) > self.neighbours:  # 提交后已缩放至较远的级别, 跳过
+            wx.CallAfter(self.on_scaled, generation, key, None)
+            return
+        wx.CallAfter(self.on_scaled, generation, key, scale_frame(frame, self.scale_levels[key[0]]))
+
+    def on_scaled(self, generation: int, key: PyramidKey, scaled: Image.Image | None):
+        """(主线程) 后台缩放完成, 创建位图"""
+        if generation != self.generation or key not in self.pending:
+            return
+        self.pending.discard(key)
+        if scaled is not None:
+            self.put(key, scaled)
+
+    def clear(self):
+        self.generation += 1
+        self.bitmaps.clear()
+        self.pending.clear()
+        self.total_bytes = 0
+
+    def close(self):
+        """销毁所有位图, 确保在GraphicsContext销毁时不会触发内存泄漏"""
+        self.generation += 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for bitmap, _ in self.bitmaps.values():
+            bitmap.Destroy()
+        self.clear()
@@ -9,7 +9,7 @@ from PIL.Image import Resampling, Transpose
 from lib.clipboard import PUBLIC_MASK_CLIPBOARD
 from lib.dialog_fix import register_close
 from lib.dpi import TS
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImg2WxBmp
 from widget.center_text import CenteredText
 from widget.data_dialog import DataDialog, DataLineParam, DataLineType
 from widget.win_icon import set_multi_size_icon
@@ -525,7 +525,7 @@ class MaskEditorPanel(wx.Window):
         image.putalpha(int(255 * 0.7))
         image.paste(self.alpha_back, (0, 0), self.mask)
         image = image.resize((int(image.width * scale), int(image.height * scale)), Image.Resampling.NEAREST)
-        return PilImg2WxImg(image).ConvertToBitmap()
+        return PilImg2WxBmp(image)
 
 
 def test_main():
@@ -4,7 +4,7 @@ from lib.cursor.setter import CursorKind
 from lib.data import CursorElement, AssetType, source_manager, AssetSourceInfo
 from lib.dialog_fix import register_close
 from lib.dpi import TS
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImg2WxBmp
 from ui_ctl.element_add_dialog import ElementAddDialog, ElementSelectList, RectElementSource, ImageElementSource
 from widget.ect_menu import EtcMenu
 from widget.no_tab_notebook import NoTabNotebook
@@ -189,7 +189,7 @@ class SourceInfoEditDialog(wx.Dialog):
         elif source_info.type == AssetType.IMAGE:
             self.image_source.resize_width.set_value(source_info.size[0])
             self.image_source.resize_height.set_value(source_info.size[1])
-            self.image_source.preview_bitmap.SetBitmap(PilImg2WxImg(source_info.image).ConvertToBitmap())
+            self.image_source.preview_bitmap.SetBitmap(PilImg2WxBmp(source_info.image))
             self.image_source.active_image = source_info.image.copy()
             self.notebook.switch_page(2)
 
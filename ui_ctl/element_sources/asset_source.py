@@ -7,13 +7,15 @@ from typing import Optional
 from zipfile import ZipFile
 
 import wx
-from PIL import Image, UnidentifiedImageError
+from PIL import Image
 from PIL.Image import Resampling
 from win32gui import ExtractIconEx
 
 from lib.cursor.setter import CursorKind
 from lib.data import source_manager, AssetsChoicerAssetInfo
-from lib.image_pil2wx import PilImg2WxImg
+from lib.datas.source_decoder import decode_service, DecodeTask, DecodeResult
+from lib.datas.source_thumbnail import ThumbnailAtlas, translate_item_icon
+from lib.image_pil2wx import PilImg2WxBmp, PilImgs2ImageList
 from lib.log import logger
 from ui.element_add_dialog import ElementSelectListUI, AssetSource
 from ui_ctl.element_sources.source_assets_manager import SourceAssetsManager
@@ -21,22 +23,6 @@ from widget.data_dialog import DataDialog, DataLineParam, DataLineType
 from widget.ect_menu import EtcMenu
 
 
-def translate_item_icon(image: Image.Image) -> Image.Image:
-    image = image.convert("RGBA")
-    if image.size == (16, 16):
-        return image
-    elif image.size == (18, 18):  # 效果图标
-        return image.crop((1, 1, 17, 17))
-    t_width = min(image.width, 16)
-    t_height = min(image.height, 16)
-    image = image.resize((t_width, t_height), Resampling.BICUBIC)
-    if image.size == (16, 16):
-        return image
-    base = Image.new("RGBA", (16, 16))
-    base.paste(image, (int((16 - image.width) / 2), int((16 - image.height) / 2)))  # 居中粘贴
-    return base
-
-
 def get_item_children(tree_view, item: wx.TreeItemId) -> list[wx.TreeItemId]:
     subitems = []
     child, cookie = tree_view.GetFirstChild(item)
@@ -80,9 +66,15 @@ class ElementSelectList(ElementSelectListUI):
         self.roots_to_assets_map: dict[str, dict[wx.TreeItemId, str]] = {}
         self.loaded_roots: list[wx.TreeItemId] = []
         self.dir_image_list: wx.ImageList | None = None
+        self.atlas: ThumbnailAtlas | None = None
+        self.atlas_bitmap: wx.Bitmap | None = None
+        self.icon_tasks: dict[wx.TreeItemId, DecodeTask] = {}  # 根节点 -> 后台解码缩略图的任务
+        self.frames_task: DecodeTask | None = None
 
         self.load_source()
         self.assets_tree.Bind(wx.EVT_TREE_ITEM_EXPANDING, self.on_expand_root)
+        self.assets_tree.Bind(wx.EVT_TREE_ITEM_COLLAPSED, self.on_collapse_root)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
         self.assets_tree.Bind(wx.EVT_TREE_ITEM_ACTIVATED, self.on_select_item)
         self.assets_tree.Bind(wx.EVT_LEFT_DOWN, self.on_click)
         self.assets_tree.Bind(wx.EVT_RIGHT_DOWN, self.on_menu)
@@ -103,7 +95,21 @@ class ElementSelectList(ElementSelectListUI):
             self.source = dialog.get_result()
             self.load_source()
 
+    def on_destroy(self, event: wx.WindowDestroyEvent):
+        event.Skip()
+        if event.GetEventObject() is self:
+            self.cancel_decode_tasks()
+
+    def cancel_decode_tasks(self):
+        for task in self.icon_tasks.values():
+            task.cancel()
+        self.icon_tasks.clear()
+        if self.frames_task:
+            self.frames_task.cancel()
+            self.frames_task = None
+
     def load_source(self):
+        self.cancel_decode_tasks()
         self.tree_image_list.RemoveAll()
         self.assets_tree.DeleteAllItems()
         self.loaded_roots.clear()
@@ -112,6 +118,8 @@ class ElementSelectList(ElementSelectListUI):
         self.assets.load_source(self.source, self.kind)
 
         self.zip_file = self.assets.file
+        self.atlas = None
+        self.atlas_bitmap = None
 
     def on_expand_root(self, event: wx.TreeEvent):  # 展开根节点时, 加载根节点下所有节点的缩略图
         event.Skip()
@@ -122,21 +130,47 @@ class ElementSelectList(ElementSelectListUI):
         if self.real_root != root_parent and root not in self.assets.sub_assets_roots:  # 必须是根节点的子节点
             return
         self.load_root(root)
+        self.load_atlas()
+        pending: list[tuple[wx.TreeItemId, str]] = []
         for child in get_item_children(self.assets_tree, root):
-            try:
-                image_io = BytesIO(self.zip_file.read(self.assets_map[child]))
-            except KeyError:  # 适配推荐树
+            path = self.assets_map.get(child)
+            if path is None:  # 适配推荐树
                 logger.debug(f"项没有图标: {self.assets_tree.GetItemText(child)}")
                 continue
-            try:
-                pil_image = translate_item_icon(Image.open(image_io))
-            except UnidentifiedImageError:  # 真TM奇怪的错误
-                logger.info(f"图片读取错误: {self.assets_map[child]}")
+            if self.atlas and (rect := self.atlas.rect(path)):  # 直接从图集中截取缩略图
+                image = self.tree_image_list.Add(self.atlas_bitmap.GetSubBitmap(wx.Rect(*rect)))
+                self.assets_tree.SetItemImage(child, image)
                 continue
-            image = self.tree_image_list.Add(PilImg2WxImg(pil_image).ConvertToBitmap())
-            self.assets_tree.SetItemImage(child, image)
+            pending.append((child, path))
+        if pending:  # 图集尚未生成, 在后台解码
+            self.icon_tasks[root] = decode_service.submit(
+                self.source.id, pending, lambda task, results: wx.CallAfter(self.on_icons_decoded, task, results),
+                translate_item_icon)
         self.loaded_roots.append(root)
 
+    def on_icons_decoded(self, task: DecodeTask, results: list[DecodeResult]):
+        if task.is_cancelled:  # 节点已被折叠或素材库已切换
+            return
+        indexes = PilImgs2ImageList(self.tree_image_list, [pil_image for _, pil_image in results])
+        for (child, _), image in zip(results, indexes):
+            self.assets_tree.SetItemImage(child, image)
+
+    def on_collapse_root(self, event: wx.TreeEvent):  # 折叠时取消未完成的缩略图解码, 再次展开时重新加载
+        event.Skip()
+        root = event.GetItem()
+        task = self.icon_tasks.pop(root, None)
+        if task is None or task.done:
+            return
+        task.cancel()
+        if root in self.loaded_roots:
+            self.loaded_roots.remove(root)
+
+    def load_atlas(self):
+        """获取当前素材库的缩略图图集, 图集仍在后台生成时保持为None"""
+        if self.atlas is None and (atlas := source_manager.get_atlas(self.source.id)):
+            self.atlas = atlas
+            self.atlas_bitmap = PilImg2WxBmp(atlas.sheet)
+
     def load_root(self, root: wx.TreeItemId):
         if root in self.roots_to_assets_map or root in self.assets.sub_assets_roots:
             return
@@ -187,6 +221,9 @@ class ElementSelectList(ElementSelectListUI):
                 item == self.showing_item]):
             return
         self.showing_item = item
+        if self.frames_task:  # 上一个多帧动画尚未解码完毕
+            self.frames_task.cancel()
+            self.frames_task = None
         if self.assets_tree.ItemHasChildren(item):  # 多帧动画
             self.note.switch_page(ES_DIR)
             self.dir_view.ClearAll()
@@ -204,17 +241,16 @@ class ElementSelectList(ElementSelectListUI):
                 raise
             children: list[wx.TreeItemId] = [mapping[path] for path in paths]
 
-            image_io = BytesIO(self.zip_file.read(self.assets_map[children[0]]))
-            first_image = Image.open(image_io)
-            self.dir_image_list = wx.ImageList(first_image.width * ES_MUTIL_DIR, first_image.height * ES_MUTIL_DIR)
+            width, height = self.assets.index.image_sizes[self.assets_map[children[0]]]  # 无需解码第一帧
+            self.dir_image_list = wx.ImageList(width * ES_MUTIL_DIR, height * ES_MUTIL_DIR)
             self.dir_view.AssignImageList(self.dir_image_list, wx.IMAGE_LIST_SMALL)
             for i, child in enumerate(children):
-                image_io = BytesIO(self.zip_file.read(self.assets_map[child]))
-                pil_image = Image.open(image_io).resize(
-                    (first_image.width * ES_MUTIL_DIR, first_image.height * ES_MUTIL_DIR),
-                    Resampling.NEAREST)
-                image = self.dir_image_list.Add(PilImg2WxImg(pil_image).ConvertToBitmap())
-                self.dir_view.InsertItem(i, self.assets_tree.GetItemText(child), image)
+                self.dir_view.InsertItem(i, self.assets_tree.GetItemText(child), -1)
+            # 在后台解码各帧, 完成后再填入图标
+            self.frames_task = decode_service.submit(
+                self.source.id, [(i, self.assets_map[child]) for i, child in enumerate(children)],
+                lambda task, results: wx.CallAfter(self.on_frames_decoded, task, results),
+                lambda image: image.resize((width * ES_MUTIL_DIR, height * ES_MUTIL_DIR), Resampling.NEAREST))
             return
 
         # 单帧图片
@@ -224,6 +260,13 @@ class ElementSelectList(ElementSelectListUI):
         self.set_shower_bitmap(pil_image)
         self.note.switch_page(ES_SHOWER)
 
+    def on_frames_decoded(self, task: DecodeTask, results: list[DecodeResult]):
+        if task.is_cancelled:  # 已切换至其他项
+            return
+        indexes = PilImgs2ImageList(self.dir_image_list, [pil_image for _, pil_image in results])
+        for (i, _), image in zip(results, indexes):
+            self.dir_view.SetItemImage(i, image)
+
     def set_shower_bitmap(self, image: Image.Image):
         image = image.convert("RGBA")
         shower_size = self.asset_shower.GetSize()
@@ -239,7 +282,7 @@ class ElementSelectList(ElementSelectListUI):
         else:
             width, height = image.width * mutil, image.height * mutil
             pil_image = image.resize((max(1, round(width)), max(1, round(height))), Resampling.NEAREST)
-        self.asset_shower.SetBitmap(PilImg2WxImg(pil_image))
+        self.asset_shower.SetBitmap(PilImg2WxBmp(pil_image))
 
     def get_element_info(self, single_frame: bool = False) -> Optional[AssetsChoicerAssetInfo]:
         if self.showing_item is None:
@@ -252,9 +295,8 @@ class ElementSelectList(ElementSelectListUI):
                     children = [children[index]]
                 paths = [self.assets_map[child] for child in children]
                 paths.sort(key=lambda v: int(v.split("_")[-1].split(".")[0]))
-                return AssetsChoicerAssetInfo(
-                    [(Image.open(BytesIO(self.zip_file.read(path))).convert("RGBA"), path)
-                     for path in paths], self.source.id)
+                return AssetsChoicerAssetInfo(list(zip(decode_service.decode(self.source.id, paths), paths)),
+                                              self.source.id)
             zip_path = self.assets_map[self.showing_item]
             image_io = BytesIO(self.zip_file.read(zip_path))
             return AssetsChoicerAssetInfo([(Image.open(image_io).convert("RGBA"), zip_path)], self.source.id)
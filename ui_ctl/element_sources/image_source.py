@@ -5,7 +5,7 @@ from PIL import Image, ImageGrab
 from PIL.Image import Resampling
 
 from lib.data import CursorElement, AssetSourceInfo, AssetType
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImg2WxImg, PilImg2WxBmp
 from ui.element_add_dialog import ImageElementSourceUI
 from widget.data_entry import EVT_DATA_UPDATE
 
@@ -98,7 +98,7 @@ class ImageElementSource(ImageElementSourceUI):
 
         image = self.active_image.copy()
         image = image.resize((self.resize_width.data, self.resize_height.data), self.resize_resample.data)
-        self.preview_bitmap.SetBitmap(PilImg2WxImg(image).ConvertToBitmap())
+        self.preview_bitmap.SetBitmap(PilImg2WxBmp(image))
 
     def get_element(self):
         if self.active_image is None:
@@ -1,15 +1,13 @@
 import json
-import re
 import typing
 from enum import Enum
 from os.path import expandvars, isfile
-from zipfile import ZipInfo
 
 import wx
 from win32gui import ExtractIconEx
 
 from lib.cursor.setter import CursorKind
-from lib.data import AssetSource, source_manager
+from lib.data import AssetSource, source_manager, SourceIndex
 from lib.log import logger
 
 
@@ -61,10 +59,6 @@ ROOT_LOADING_WAYS = {
     "particle": AssetRootLoadWay.FLAT_EXPAND,
 }
 
-NUM_PATTER = re.compile(r'_?\d+')
-ANIM_FRAME_PATTER = re.compile(r'\d+\.\w+$')
-
-
 class DirTree:
     def __init__(self, name: str):
         self.name = name
@@ -86,19 +80,16 @@ class DirTree:
         return self.dirs[crt_name].create_dir(dir_names)
 
     @staticmethod
-    def load(name: str, filelist: list[ZipInfo]):
+    def load(name: str, filelist: list[str]):
         root_dir = DirTree(name)
-        for info in filelist:
-            fp = info.filename.split("/")
+        for path in filelist:
+            fp = path.split("/")
             fp.pop(0)
-            if info.is_dir():
-                root_dir.create_dir(fp[:-1])
-            else:
-                filename = fp.pop(-1)
-                crt_root = root_dir.find(fp.copy())
-                if crt_root is None:
-                    crt_root = root_dir.create_dir(fp)
-                crt_root.files.append(filename)
+            filename = fp.pop(-1)
+            crt_root = root_dir.find(fp.copy())
+            if crt_root is None:
+                crt_root = root_dir.create_dir(fp)
+            crt_root.files.append(filename)
         return root_dir
 
     def full_data(self, tree_ctrl: wx.TreeCtrl, root: wx.TreeItemId, assets_roots: list[wx.TreeItemId],
@@ -128,7 +119,8 @@ class SourceAssetsManager:
         self.tree_ctrl = tree_ctrl
         self.image_list = image_list
         self.file = source_manager.load_zip(source_id)
-        self.root_files_map: dict[str, list[ZipInfo]] = {}  # 从根节点名称 -> 文件列表
+        self.index: SourceIndex | None = None
+        self.root_files_map: dict[str, list[str]] = {}  # 从根节点名称 -> 文件列表
         self.assets_roots: dict[wx.TreeItemId, str] = {}  # 从根节点 -> 根节点名称
         self.sub_assets_roots: list[wx.TreeItemId] = []
         self.source: AssetSource | None = None
@@ -167,26 +159,13 @@ class SourceAssetsManager:
         if self.dir_icon:
             self.dir_image = self.image_list.Add(self.dir_icon)
 
-        # Step1 -> 提取所有根节点
-        root_names: list[str] = []
-        self.root_files_map = {}
-        for _, info in self.file.NameToInfo.items():
-            fp = info.filename.split("/")
-            if fp[-1].endswith(".mcmeta"):  # 筛选掉 .mcmeta文件
-                continue
-            root_name = fp[0]
-            if info.is_dir():
-                fp.pop(-1)
-                if len(fp) == 1:
-                    root_names.append(root_name)
-            else:
-                if root_name not in self.root_files_map:
-                    self.root_files_map[root_name] = []
-                self.root_files_map[root_name].append(info)
+        # Step1 -> 从索引获取所有根节点
+        self.index = source_manager.load_index(source.id)
+        self.root_files_map = self.index.root_files
 
         # Step2 -> 加载根节点
         self.assets_roots.clear()
-        for root_name in ["推荐"] + root_names:
+        for root_name in ["推荐"] + self.index.root_names:
             if root_name in ROOT_IMAGES:
                 image = self.image_list.Add(wx.Bitmap(ROOT_IMAGES[root_name]))
             else:
@@ -224,50 +203,17 @@ class SourceAssetsManager:
             self.sub_assets_roots.append(kind_root)
         return assets_map
 
-    def load_flat_expand_root(self, root_item: wx.TreeItemId, filelist: list[ZipInfo]):
+    def load_flat_expand_root(self, root_item: wx.TreeItemId, root_name: str):
         assets_map: dict[wx.TreeItemId, str] = {}
-
-        asset_list = []
-        animation_frames: dict[str, dict[int, str]] = {}
-        # 初步筛选出动画帧
-        for info in filelist:
-            full_path = info.filename
-            filename = info.filename.split("/")[-1]
-
-            if re.findall(ANIM_FRAME_PATTER, filename):  # 如果文件名以数字结尾
-                no_num_path = re.sub(NUM_PATTER, "", full_path)
-                number = int(re.findall(NUM_PATTER, filename)[0].lstrip("_"))
-                if no_num_path not in animation_frames:
-                    animation_frames[no_num_path] = {number: full_path}
-                else:
-                    animation_frames[no_num_path][number] = full_path
-            asset_list.append(full_path)
-
-        # 排除被误判的动画帧 + 排序帧
-        for no_num_path, frames in animation_frames.copy().items():
-            if len(frames) == 1:  # 只有一帧, pass
-                animation_frames.pop(no_num_path)
-                continue
-            numbers = [number for number, _ in frames.items()]
-            numbers.sort()
-            if list(range(len(frames))) != numbers:  # 不是有序序列, pass
-                animation_frames.pop(no_num_path)
-                continue
-            # 删除+更新
-            first_index = asset_list.index(frames[0])
-            [asset_list.remove(path) for path in frames.values()]
-            asset_list.insert(first_index, no_num_path)
-            # 替换排序过的帧列表
-            paths = [frames[number] for number in numbers]
-            animation_frames[no_num_path] = {number: path for number, path in zip(numbers, paths)}
+        animation_frames = self.index.animations  # 动画帧已在建立索引时筛选并排序
 
         # 填充数据
-        for file_path in asset_list:
+        for file_path in self.index.flat_assets.get(root_name, []):
             if file_path in animation_frames:  # 加载动画帧
                 animation_root = self.tree_ctrl.AppendItem(root_item, file_path.split("/")[-1])  # 文件名当标签
                 self.sub_assets_roots.append(animation_root)
                 assets_map[animation_root] = animation_frames[file_path][0]  # 使用第一帧作为动画根节点的缩略图
-                for _, frame_path in animation_frames[file_path].items():
+                for frame_path in animation_frames[file_path]:
                     filename = frame_path.split("/")[-1]
                     item = self.tree_ctrl.AppendItem(animation_root, filename)
                     assets_map[item] = frame_path
@@ -277,13 +223,13 @@ class SourceAssetsManager:
             assets_map[item] = file_path
         return assets_map
 
-    def load_asset_root(self, root_item: wx.TreeItemId, root_name: str, filelist: list[ZipInfo] | None):
+    def load_asset_root(self, root_item: wx.TreeItemId, root_name: str, filelist: list[str] | None):
         way = ROOT_LOADING_WAYS.get(root_name, AssetRootLoadWay.AS_TREE)
         assets_map: dict[wx.TreeItemId, str] = {}
         if way == AssetRootLoadWay.AS_RECOMMEND:
             assets_map = self.load_recommend_root(root_item)
         elif way == AssetRootLoadWay.FLAT_EXPAND:
-            assets_map = self.load_flat_expand_root(root_item, filelist)
+            assets_map = self.load_flat_expand_root(root_item, root_name)
         elif way == AssetRootLoadWay.AS_TREE:  # 这个写的爽, 啥也不用做直接开始遍历
             dir_tree = DirTree.load(root_name, filelist)
             assets_map = dir_tree.full_data(self.tree_ctrl, root_item, self.sub_assets_roots, dir_image=self.dir_image)
@@ -11,7 +11,7 @@ from lib.config import config
 from lib.cursor.setter import CURSOR_KIND_NAME_OFFICIAL, CursorKind
 from lib.data import CursorTheme, CursorProject, INVALID_FILENAME_CHAR, ThemeType
 from lib.dpi import BL_SIZE
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImgs2ImageList
 from lib.log import logger
 from lib.render import render_project_frame
 from lib.resources import theme_manager
@@ -232,7 +232,7 @@ class ProjectMoveThemeDialog(DataDialog):
                                        getattr(self.themes_enum_cls, active_theme.id),
                                        enum_names={ \
                                            getattr(self.themes_enum_cls, theme.id): \
-                                               f"{theme.name} ({len(theme.projects)}-cur)" \
+                                               f"{theme.name} ({theme.project_count}-cur)" \
                                            for theme in themes}))
         self.set_icon("project/move.png")
 
@@ -319,11 +319,9 @@ class PublicThemeCursorList(PublicThemeCursorListUI):
         size = self.ICON_SIZE
         self.image_list = wx.ImageList(size, size)
         self.AssignImageList(self.image_list, wx.IMAGE_LIST_NORMAL)
-        for i, project in enumerate(projects):
-            cursor_image = render_project_frame(project, 0)
-            cursor_image = cursor_image.resize((size, size), Resampling.BOX)
-            cursor_bitmap = PilImg2WxImg(cursor_image).ConvertToBitmap()
-            cursor_image_id = self.image_list.Add(cursor_bitmap)
+        cursor_images = [render_project_frame(project, 0).resize((size, size), Resampling.BOX) for project in projects]
+        cursor_image_ids = PilImgs2ImageList(self.image_list, cursor_images)
+        for i, (project, cursor_image_id) in enumerate(zip(projects, cursor_image_ids)):
             if project.external_name is not None:
                 name = project.external_name
             else:
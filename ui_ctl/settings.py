@@ -58,13 +58,31 @@ LABEL_MAP = {
     "default_project_scale": "默认项目缩放",
     "default_project_size": "默认项目画布大小",
     "default_project_render_scale": "默认项目渲染缩放",
-    "scaled_directly": "直接缩放输出"
+    "scaled_directly": "直接缩放输出",
+    "render_cache_size": "渲染缓存大小 (MB)",
+    "render_workers": "渲染进程数",
+    "numpy_compositor": "使用NumPy合成",
+    "lazy_load_themes": "懒加载主题",
+    "multi_size_cursors": "导出多尺寸指针",
+    "export_cache_size": "导出缓存大小 (MB)",
+    "render_profiling": "记录渲染耗时",
+    "canvas_cache_size": "编辑器缩放缓存大小 (MB)",
+    "prerender_frames": "编辑器预渲染帧数"
 }
 
 TIP_MAP = {
     "default_project_scale": "决定项目任何时候(编辑时/应用时)的缩放",
     "default_project_render_scale": "仅在应用主题时使用的缩放",
-    "scaled_directly": "渲染缩放不再具体到元素, 而是在结果上直接使用最临近缩放"
+    "scaled_directly": "渲染缩放不再具体到元素, 而是在结果上直接使用最临近缩放",
+    "render_cache_size": "缓存元素变换结果所用的内存上限, 拖动元素时不再重复变换其他元素",
+    "render_workers": "应用与导出主题时并行渲染的进程数, 0为CPU核心数",
+    "numpy_compositor": "使用NumPy数组合成元素, 输出与PIL合成完全一致, 未安装NumPy时不生效",
+    "lazy_load_themes": "启动时只读取主题信息, 选中主题时才加载其中的指针项目, 重启后生效",
+    "multi_size_cursors": "导出的指针同时包含由渲染结果缩小的多个尺寸, 更改系统指针大小时无需重新应用主题",
+    "export_cache_size": "保存导出的指针文件, 再次应用或导出未修改的项目时无需重新渲染, 0为不缓存",
+    "render_profiling": "记录每个元素与处理步骤的渲染耗时, 程序关闭时保存至数据文件夹的 Render Profile 中 (重启后生效)",
+    "canvas_cache_size": "项目编辑器预先缩放当前及相邻缩放比例下各帧所用的内存上限, 滚轮缩放动画时不再逐帧重新缩放",
+    "prerender_frames": "项目编辑器播放动画时在后台提前渲染的帧数, 播放时不再等待渲染"
 }
 
 
@@ -12,7 +12,7 @@ from lib.datas.base_struct import generate_id
 from lib.datas.data_dir import path_user_sources
 from lib.dialog_fix import register_close
 from lib.dpi import TS
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImg2WxBmp
 from lib.perf import Counter
 from lib.round_corner import add_rounded_corners
 from lib.source_cvt import load_jar2source, load_zip2source
@@ -106,7 +106,7 @@ class SourcesEditor(wx.Dialog):
                 x, y = ((self.ICON_SIZE - image.size[0]) // 2, (self.ICON_SIZE - image.size[1]) // 2)
                 image = ImageOps.expand(image, (x, y, x, y), fill=(0, 0, 0, 0))
                 image = add_rounded_corners(image, 12)
-                icon = self.image_list.Add(PilImg2WxImg(image).ConvertToBitmap())
+                icon = self.image_list.Add(PilImg2WxBmp(image))
             else:
                 icon = -1
             item = self.ctrl.InsertItem(i, source.name, icon)
@@ -257,6 +257,7 @@ class SourcesEditor(wx.Dialog):
                 if ret != wx.YES:
                     return
                 have_asked = True
+            source_manager.release_source(source.id)
             rmtree(source.source_dir)
             source_manager.user_sources.remove(source)
             while source.id in config.enabled_sources:
@@ -2,7 +2,9 @@ import json
 import os
 import re
 import sys
+from concurrent.futures import Future
 from enum import Enum
+from functools import partial
 from os import makedirs
 from os.path import join, isfile, expandvars, isdir
 from os.path import join as path_join
@@ -11,21 +13,25 @@ from threading import Thread
 from typing import cast
 
 import wx
+from PIL import Image
 from PIL.Image import Resampling
 
 from lib.config import config
 from lib.cursor.inst_ini_gen import CursorInstINIGenerator
 from lib.cursor.setter import CURSOR_KIND_NAME_OFFICIAL, CursorKind, CursorsInfo, set_cursors_progress, SchemesType, \
     CR_INFO_FIELD_MAP, CursorData
+from lib.cursor.export_cache import export_cursors
 from lib.cursor.writer import write_cursor_progress
-from lib.data import CursorTheme, path_theme_cursors, path_theme_data, INVALID_FILENAME_CHAR, ThemeType, source_manager
+from lib.data import CursorTheme, LazyCursorTheme, path_theme_cursors, path_theme_data, INVALID_FILENAME_CHAR, ThemeType, source_manager
 from lib.datas.base_struct import AssetType
+from lib.datas.data_dir import main_dir
 from lib.datas.project import CursorProject
 from lib.datas.source import AssetSource, SourceNotFoundError
 from lib.log import logger
 from lib.perf import Counter
-from lib.render import render_project
+from lib.render_profile import render_profiler
 from lib.resources import theme_manager, ThemeAction, deleted_theme_manager, ThemeFileType
+from lib.theme_writer import theme_writer
 from ui.select import select_all
 from ui.theme_editor import ThemeEditorUI
 from ui_ctl.about_dialog import AboutDialog
@@ -150,7 +156,8 @@ class ThemeFileTypeDialog(DataDialog):
                                        enum_names={
                                            ThemeFileType.RAW_JSON: "原始Json (体积大) (可直接编辑)",
                                            ThemeFileType.ZIP_COMPRESS: "Zip流 (体积小) (便于分享)",
-                                           ThemeFileType.ZIP_FILE: "Zip文件 (包含所需源)"
+                                           ThemeFileType.ZIP_FILE: "Zip文件 (包含所需源)",
+                                           ThemeFileType.BLOB_CONTAINER: "图像块容器 (保存快) (需新版本打开)"
                                        }))
         self.set_icon("theme/theme_file_type.png")
 
@@ -167,6 +174,8 @@ class ThemeEditor(ThemeEditorUI):
         self.SetIcons(wx.IconBundle("assets/icon.ico"))
         self.Bind(EVT_THEME_SELECTED, lambda e: self.cursor_list.load_theme(e.theme))
         self.Bind(wx.EVT_CLOSE, self.on_close)
+        theme_manager.register_theme_change_callback(ThemeAction.LOAD_FAILED,
+                                                     lambda theme: wx.CallAfter(self.on_theme_load_failed, theme))
 
         if config.first_launch:
             wx.CallLater(3000, self.on_first_launch)
@@ -202,13 +211,23 @@ class ThemeEditor(ThemeEditorUI):
         config.first_launch = False
         config.save_config()
 
+    def on_theme_load_failed(self, theme: CursorTheme):
+        if self.cursor_list.active_theme is theme:
+            self.cursor_list.load_theme(None)
+        self.theme_selector.reload_themes()
+        wx.MessageBox(f"主题 [{theme.name}] 缺少所需的源, 项目加载失败, 已从主题列表中移除\n"
+                      f"主题文件未被改动, 补全源后重新启动即可加载", "主题加载失败", wx.OK | wx.ICON_WARNING)
+
     @staticmethod
     def on_close(event: wx.CloseEvent):
         """程序关闭前的动作"""
         theme_manager.save()
         deleted_theme_manager.save()
+        theme_writer.flush()  # 等待后台保存线程写入完成
         config.save_config()
         source_manager.save_source()
+        if render_profiler.enabled:
+            render_profiler.dump(main_dir.make_sub_dir("Render Profile"))
         event.Skip()
 
 
@@ -403,6 +422,10 @@ class ThemeSelector(PublicThemeSelector):
         ret = wx.MessageBox(f"确定要删除这{len(themes)}个主题吗？", "提示", wx.YES_NO | wx.ICON_QUESTION)
         if ret != wx.YES:
             return
+        for theme in themes:
+            if isinstance(theme, LazyCursorTheme):
+                theme.hydrate()  # 删除前加载项目以便备份, 加载失败的主题会被移出列表
+        themes = [theme for theme in themes if theme in theme_manager.themes]
         indexes: list[int] = [{v: k for k, v in self.line_theme_mapping.items()}[theme] for theme in themes]
         self.themes_has_deleted.append([(line, element) for line, element in zip(indexes[::-1], themes[::-1])])
         for theme in themes:
@@ -440,16 +463,23 @@ class ThemeSelector(PublicThemeSelector):
         for theme in themes:
             export_path = os.path.join(file_dir, theme.name + "." + end_fix)
             if end_fix == "rmctheme":
-                theme_manager.save_rendered_theme_file(export_path, theme, file_type)
+                future = theme_manager.save_rendered_theme_file(export_path, theme, file_type)
             elif file_type == ThemeFileType.ZIP_FILE:
                 try:
                     sources = find_theme_sources(theme)
                 except SourceNotFoundError as e:
                     wx.MessageBox(f"主题 [{theme}] 中源ID为 [{e.source_id}] 的源未找到", "错误", wx.OK | wx.ICON_ERROR)
                     continue
-                theme_manager.save_theme_file(export_path, theme, file_type, sources)
+                future = theme_manager.submit_theme_file(export_path, theme, file_type, sources)
             else:
-                theme_manager.save_theme_file(export_path, theme, file_type)
+                future = theme_manager.submit_theme_file(export_path, theme, file_type)
+            future.add_done_callback(partial(self.on_theme_exported, theme, export_path))
+
+    def on_theme_exported(self, theme: CursorTheme, export_path: str, future: Future):
+        """(保存线程) 导出写入结束, 失败时在主线程提示"""
+        if (e := future.exception()) is not None:
+            wx.CallAfter(wx.MessageBox, f"导出主题 [{theme}] 至 [{export_path}] 失败: {e.__class__.__name__}: {e}",
+                         "错误", wx.OK | wx.ICON_ERROR)
 
     def on_export_theme_cursors(self, theme: CursorTheme):
         dialog = wx.DirDialog(self, "导出主题指针 - 选择保存路径", defaultPath=theme.name)
@@ -457,12 +487,12 @@ class ThemeSelector(PublicThemeSelector):
             dir_path = join(dialog.GetPath(), f"{theme.name}_{theme.id}")
             makedirs(dir_path, exist_ok=True)
             file_map: dict[CursorKind, str] = {}
+            paths = []
             for project in theme.projects:
                 file_name = f"{project.kind.off_name}" + (".ani" if project.is_ani_cursor else ".cur")
-                fp = path_join(dir_path, file_name)
-                frames = render_project(project, for_export=True)
-                list(write_cursor_progress(fp, frames, project))
                 file_map[project.kind] = file_name
+                paths.append(path_join(dir_path, file_name))
+            list(export_cursors(theme.projects, paths))
             ini = CursorInstINIGenerator.generate(theme, file_map)
             try:
                 with open(path_join(dir_path, "~右键安装.inf"), "w", encoding="gbk") as f:
@@ -552,20 +582,20 @@ def apply_theme(theme: CursorTheme, target: SchemesType, raw_size: bool,
     theme_cursors_dir = path_theme_cursors.make_sub_dir(f"Theme_{theme.id}_{theme.name}")
     dialog.set_panels_num(2)
     dialog.update(0, 0, range_=len(theme.projects))
-    for i, project in enumerate(theme.projects):
-        dialog.update(0, i, f"导出项目: {project}")
-        dialog.update(1, 0, "...")
-        frames = render_project(project, for_export=True)
-        file_name = f"Cursor_{project.id}_{project.kind.off_name}" + (".ani" if project.is_ani_cursor else ".cur")
-        file_path = join(theme_cursors_dir, file_name)
+
+    def write_progress(file_path: str, frames: list[Image.Image], project: CursorProject):
         logger.info(f"渲染指针项目: {project}")
         frames_num = len(frames)
         dialog.update(1, 0, f"写入帧 (0/{frames_num})", frames_num)
-        gen = write_cursor_progress(file_path, frames, project)
-        for msg, index in gen:
+        for msg, index in write_cursor_progress(file_path, frames, project):
             real_msg = f"{msg} ({index}/{frames_num})" if index != -1 else msg
             dialog.update(1, index, real_msg)
 
+    paths = [join(theme_cursors_dir, f"Cursor_{project.id}_{project.kind.off_name}" +
+                  (".ani" if project.is_ani_cursor else ".cur")) for project in theme.projects]
+    for i, (project, file_path) in enumerate(export_cursors(theme.projects, paths, write_progress)):
+        dialog.update(0, i + 1, f"已导出项目: {project}")
+        dialog.update(1, 0, "...")
         attr_name = CR_INFO_FIELD_MAP[project.kind]
         cursor_data: CursorData = getattr(cursor_paths, attr_name)
         cursor_data.set_path(file_path)
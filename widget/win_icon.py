@@ -1,7 +1,7 @@
 import wx
 from PIL import Image, ImageOps
 
-from lib.image_pil2wx import PilImg2WxImg
+from lib.image_pil2wx import PilImg2WxBmp
 
 
 def set_multi_size_icon(frame: wx.TopLevelWindow, icon_path: str,
@@ -19,7 +19,7 @@ def set_multi_size_icon(frame: wx.TopLevelWindow, icon_path: str,
             exp_width = int((data - int(data)) * image.width // 2)
             sized_image = ImageOps.expand(image, exp_width, (255, 255, 255, 0))
 
-        bitmap = PilImg2WxImg(sized_image).ConvertToBitmap()
+        bitmap = PilImg2WxBmp(sized_image)
         icon = wx.Icon(bitmap)
         bundle.AddIcon(icon)
     frame.SetIcons(bundle)